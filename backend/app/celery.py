@@ -1,9 +1,12 @@
 from __future__ import absolute_import
 
+import glob
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 from django.conf import settings
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
 
 __all__ = ['celery']
 
@@ -12,3 +15,21 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 celery = Celery('app')
 celery.config_from_object('django.conf:settings', namespace='CELERY')
 celery.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Отдает метрики всех процессов воркера на CELERY_METRICS_PORT (multiprocess режим prometheus_client)."""
+    if not settings.CELERY_METRICS_PORT:
+        return
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        os.remove(path)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid, **kwargs):
+    if settings.CELERY_METRICS_PORT:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,153 @@
+import json
+import logging
+import time
+from contextlib import suppress
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django_redis import get_redis_connection
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+EMAIL_SENT = Counter('emails_sent_total', 'Отправленные письма')
+EMAIL_FAILED = Counter('emails_failed_total', 'Ошибки отправки писем', ['result'])
+EMAIL_FLUSH_DURATION = Histogram('email_flush_duration_seconds', 'Время отправки пачки писем')
+
+
+class EmailQueue:
+    """Очередь писем в redis.
+    Письма копятся в списке EMAIL_QUEUE_KEY и отправляются пачками по EMAIL_BATCH_SIZE через одно SMTP соединение
+    (flush_email_queue раз в EMAIL_FLUSH_INTERVAL секунд или сразу, когда набралась пачка).
+    Письмо, которое не удалось отправить, возвращается в конец очереди, после EMAIL_MAX_ATTEMPTS попыток - удаляется.
+    Пачка на время отправки переносится в список EMAIL_QUEUE_KEY:processing, письмо удаляется из него после отправки,
+    поэтому при падении воркера письма не теряются: следующий flush вернет их в очередь.
+    Одновременно очередь отправляет только один flush (блокировка EMAIL_QUEUE_KEY:lock).
+    """
+
+    def __init__(self):
+        self.redis = get_redis_connection('default')
+        self.key = settings.EMAIL_QUEUE_KEY
+        self.processing_key = f'{self.key}:processing'
+        self.lock_key = f'{self.key}:lock'
+
+    @staticmethod
+    def make_message(recipients: list, text_context: str, subject: str, html_context: Optional[str] = None,
+                     attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER) -> dict:
+        return {
+            'recipients': recipients,
+            'text_context': text_context,
+            'subject': subject,
+            'html_context': html_context,
+            'attachments': attachments,
+            '_from': _from,
+        }
+
+    def push(self, *messages: dict) -> int:
+        """Добавляет письма одним запросом, возвращает длину очереди.
+        Письма добавляются в начало списка, а забираются с конца (pop_batch).
+        """
+        return self.redis.lpush(self.key, *(json.dumps(message) for message in messages))
+
+    def pop_batch(self, size: int) -> List[Tuple[bytes, dict]]:
+        """Переносит пачку писем в список отправляемых, возвращает пары (письмо в redis, письмо)."""
+        pipe = self.redis.pipeline()
+        for _ in range(size):
+            pipe.rpoplpush(self.key, self.processing_key)
+        return [(raw, json.loads(raw)) for raw in pipe.execute() if raw is not None]
+
+    def ack(self, raw: bytes):
+        """Удаляет письмо из списка отправляемых."""
+        self.redis.lrem(self.processing_key, 1, raw)
+
+    def requeue(self, raw: bytes, message: dict):
+        """Возвращает письмо в конец очереди."""
+        pipe = self.redis.pipeline()
+        pipe.lpush(self.key, json.dumps(message))
+        pipe.lrem(self.processing_key, 1, raw)
+        pipe.execute()
+
+    def restore_processing(self):
+        """Возвращает в очередь письма, оставшиеся в списке отправляемых после падения воркера."""
+        while self.redis.rpoplpush(self.processing_key, self.key) is not None:
+            pass
+
+    @staticmethod
+    def build_message(message: dict) -> EmailMultiAlternatives:
+        msg = EmailMultiAlternatives(
+            message['subject'], message['text_context'], message['_from'], message['recipients']
+        )
+        if message.get('html_context'):
+            msg.attach_alternative(message['html_context'], 'text/html')
+        for attachment in message.get('attachments') or []:
+            msg.attach(*attachment)
+        return msg
+
+    def send(self, connection, message: dict) -> Optional[Exception]:
+        """Отправляет письмо, при ошибке переоткрывает соединение и повторяет до EMAIL_SEND_RETRIES раз."""
+        error = None
+        for _ in range(settings.EMAIL_SEND_RETRIES + 1):
+            try:
+                connection.send_messages([self.build_message(message)])
+                return None
+            except Exception as e:
+                error = e
+                with suppress(Exception):
+                    connection.close()
+        return error
+
+    def flush(self) -> int:
+        """Отправляет очередь пачками, возвращает количество отправленных писем.
+        Если в пачке были ошибки, остаток очереди ждет следующего запуска.
+        Если очередь уже отправляет другой воркер, ничего не делает.
+        """
+        if not cache.add(self.lock_key, True, timeout=settings.EMAIL_FLUSH_LOCK_TIMEOUT):
+            return 0
+        try:
+            self.restore_processing()
+            return self.send_batches()
+        finally:
+            cache.delete(self.lock_key)
+
+    def send_batches(self) -> int:
+        sent = 0
+        while True:
+            batch = self.pop_batch(settings.EMAIL_BATCH_SIZE)
+            if not batch:
+                return sent
+            start = time.monotonic()
+            failed = False
+            # Соединение открывается при отправке первого письма и переиспользуется для всей пачки
+            connection = get_connection()
+            try:
+                for raw, message in batch:
+                    # Блокировка продлевается на каждое письмо: пачка целиком может идти дольше ее времени жизни
+                    cache.touch(self.lock_key, timeout=settings.EMAIL_FLUSH_LOCK_TIMEOUT)
+                    logger.info(
+                        f'Sending email to: {message["recipients"]}, subject: {message["subject"]}, '
+                        f'from: {message["_from"]}'
+                    )
+                    error = self.send(connection, message)
+                    if not error:
+                        self.ack(raw)
+                        EMAIL_SENT.inc()
+                        sent += 1
+                        continue
+                    failed = True
+                    message['attempts'] = message.get('attempts', 0) + 1
+                    if message['attempts'] < settings.EMAIL_MAX_ATTEMPTS:
+                        EMAIL_FAILED.labels(result='requeued').inc()
+                        logger.warning(f'Error sending email to: {message["recipients"]}: {error}. Retry later')
+                        self.requeue(raw, message)
+                    else:
+                        self.ack(raw)
+                        EMAIL_FAILED.labels(result='dropped').inc()
+                        logger.error(f'Email to: {message["recipients"]}, subject: {message["subject"]} not sent: {error}')
+            finally:
+                with suppress(Exception):
+                    connection.close()
+            EMAIL_FLUSH_DURATION.observe(time.monotonic() - start)
+            if failed or len(batch) < settings.EMAIL_BATCH_SIZE:
+                return sent
@@ -1,16 +1,209 @@
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
 from django.conf import settings
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+
+from core.utils import bump_cache_version, get_cache_version
+
+PAGINATION_COUNT_VERSION_KEY = 'pagination_count_version'
+
+
+def invalidate_pagination_counts():
+    """Сбрасывает закэшированные total списков (после коммита транзакции)."""
+    transaction.on_commit(lambda: bump_cache_version(PAGINATION_COUNT_VERSION_KEY))
+
+
+class ExactCountStrategy:
+    """Точный COUNT(*) на каждый запрос."""
+
+    def count(self, queryset: QuerySet) -> Tuple[int, bool]:
+        """Возвращает (количество, точное ли количество)."""
+        return queryset.count(), True
+
+
+class CachedCountStrategy(ExactCountStrategy):
+    """Точное количество кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT секунд.
+    Ключ - хэш SQL запроса без сортировки и его параметров, те в него входят все фильтры, включая зависящие от пользователя.
+    Кэш сбрасывается при изменении вакансий, откликов и шагов (invalidate_pagination_counts).
+    """
+
+    def count(self, queryset: QuerySet) -> Tuple[int, bool]:
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0, True
+        key = 'pagination_count:{version}:{hash}'.format(
+            version=get_cache_version(PAGINATION_COUNT_VERSION_KEY),
+            hash=hashlib.sha256(f'{sql}{params!r}'.encode()).hexdigest(),
+        )
+        count = cache.get(key)
+        if count is None:
+            count, _ = super().count(queryset)
+            cache.set(key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count, True
+
+
+class EstimatedCountStrategy(CachedCountStrategy):
+    """Для списков без фильтров количество берется из статистики Postgres (pg_class.reltuples).
+    Оценка используется, только если она не меньше PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+    на маленьких таблицах точный подсчет дешевый, а статистика может быть неактуальной.
+    Для остальных списков - точное количество через кэш.
+    """
+
+    def count(self, queryset: QuerySet) -> Tuple[int, bool]:
+        # Без фильтров и join-ов (кроме select_related) строк в выборке столько же, сколько в таблице
+        query = queryset.query
+        if connection.vendor == 'postgresql' and not query.where and len(query.alias_map) <= 1:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+                return row[0], False
+        return super().count(queryset)
 
 
 class DataWrappingLimitOffsetPagination(LimitOffsetPagination):
+    """В pagination.total_exact отдается, точное ли количество total или оценка (см. count_strategy_class)."""
     default_limit = settings.DEFAULT_PAGINATION_LIMIT
+    count_strategy_class = EstimatedCountStrategy
+
+    def get_count(self, queryset: QuerySet) -> int:
+        if not isinstance(queryset, QuerySet):
+            self.count_exact = True
+            return super().get_count(queryset)
+        count, self.count_exact = self.count_strategy_class().count(queryset)
+        return count
 
     def get_paginated_response(self, data):
-        return JsonResponse({
+        # Ответ рендерится через DataWrappingJSONRenderer, как и остальные ответы API
+        return Response({
             'pagination': {
                 'total': self.count,
+                'total_exact': self.count_exact,
                 'offset': self.offset,
             },
-            'data': data
+            'data': data,
         })
+
+
+class DataWrappingKeysetPagination(DataWrappingLimitOffsetPagination):
+    """Пагинация по ключу сортировки (keyset).
+    Без параметра cursor работает как DataWrappingLimitOffsetPagination и дополнительно отдает pagination.next -
+    курсор следующей страницы. С курсором страница выбирается условием по полям сортировки queryset
+    (WHERE (hot, published_at, id) < (...)), без OFFSET и без подсчета total (в ответе total, total_exact и offset - null).
+    К сортировке добавляется -pk, если его нет, чтобы порядок был однозначным.
+    Значения NULL учитываются как в Postgres: в конце при ASC и в начале при DESC.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[List]:
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            self.count = self.offset = self.count_exact = None
+            try:
+                queryset = queryset.filter(self.get_seek_q(self.decode_cursor(cursor)))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound('Invalid cursor')
+            page = list(queryset[:self.limit + 1])
+            has_next = len(page) > self.limit
+            page = page[:self.limit]
+        else:
+            self.count = self.get_count(queryset)
+            self.offset = self.get_offset(request)
+            page = list(queryset[self.offset:self.offset + self.limit]) if self.offset < self.count else []
+            has_next = self.offset + len(page) < self.count
+        self.next_cursor = self.encode_cursor(page[-1]) if has_next and page else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'pagination': {
+                'total': self.count,
+                'total_exact': self.count_exact,
+                'offset': self.offset,
+                'next': self.next_cursor,
+            },
+            'data': data,
+        })
+
+    @staticmethod
+    def get_ordering(queryset: QuerySet) -> List[str]:
+        ordering = list(queryset.query.order_by)
+        if not all(isinstance(field, str) for field in ordering):
+            # Значения выражений не сохранить в курсоре - нужно добавить аннотацию и сортировать по ее имени
+            raise ImproperlyConfigured(f'Keyset pagination supports only field names in ordering, got {ordering}')
+        pk_name = queryset.model._meta.pk.name
+        if not {'pk', '-pk', pk_name, f'-{pk_name}'} & set(ordering):
+            ordering.append('-pk')
+        return ordering
+
+    @staticmethod
+    def get_value(instance, field: str) -> Any:
+        value = instance
+        for attr in field.lstrip('-').split('__'):
+            value = getattr(value, attr, None)
+            if value is None:
+                return None
+        return value
+
+    def encode_cursor(self, instance) -> str:
+        position = []
+        for field in self.ordering:
+            value = self.get_value(instance, field)
+            if isinstance(value, (datetime.date, datetime.time)):
+                # Не через JSONEncoder DRF - он обрезает микросекунды
+                value = value.isoformat()
+            elif isinstance(value, decimal.Decimal):
+                value = str(value)
+            position.append(value)
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> List[Any]:
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return position
+
+    def get_seek_q(self, position: Sequence[Any]) -> Q:
+        """Условие "строка после курсора": (f1 после v1) or (f1 = v1 and f2 после v2) or ..."""
+        seek_q = Q(pk__in=[])
+        equal_q = Q()
+        for field, value in zip(self.ordering, position):
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            if value is None:
+                # NULL идет первым при DESC, после него - все остальные значения. При ASC NULL - в конце
+                if descending:
+                    seek_q |= equal_q & Q(**{f'{field}__isnull': False})
+                equal_q &= Q(**{f'{field}__isnull': True})
+            else:
+                after_q = Q(**{f'{field}__lt': value}) if descending else (
+                    Q(**{f'{field}__gt': value}) | Q(**{f'{field}__isnull': True})
+                )
+                seek_q |= equal_q & after_q
+                equal_q &= Q(**{field: value})
+        return seek_q
@@ -1,12 +1,34 @@
 import json
 
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
 
 
 class DataWrappingJSONRenderer(JSONRenderer):
+    """Оборачивает ответ в {'data': ...}, ответ пагинации ({'pagination': ..., 'data': ...}) отдается как есть.
+    JSON по умолчанию компактный, отступы - только если запрошены (Accept: application/json; indent=4).
+    Если установлен orjson, сериализация через него: datetime, UUID сериализуются нативно,
+    Decimal, ленивые строки и прочее - через JSONEncoder DRF.
+    """
     charset = 'utf-8'
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
-        if data is not None:
-            data = data if 'pagination' in data else {'data': data}
-            return json.dumps(data, indent=4)
+        if data is None:
+            return b''
+        data = data if isinstance(data, dict) and 'pagination' in data else {'data': data}
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if indent:
+                # orjson поддерживает только отступ в 2 пробела
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(data, default=JSONEncoder().default, option=option)
+        separators = None if indent else (',', ':')
+        return json.dumps(
+            data, cls=JSONEncoder, indent=indent, ensure_ascii=False, separators=separators,
+        ).encode()
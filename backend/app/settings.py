@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'django_celery_beat',
@@ -155,6 +156,10 @@ JWT_USERNAME = env.str('JWT_USERNAME', default='preferred_username')
 JWT_EMAIL = env.str('JWT_EMAIL', default='email')
 JWT_FIRST_NAME = env.str('JWT_FIRST_NAME', default='given_name')
 JWT_LAST_NAME = env.str('JWT_LAST_NAME', default='family_name')
+# Максимальное время кэширования id пользователя по токену (в секундах), не дольше срока действия токена
+JWT_AUTH_CACHE_TIMEOUT = env.int('JWT_AUTH_CACHE_TIMEOUT', default=60 * 5)
+# Время хранения снимка ролей пользователя (в секундах)
+USER_ROLES_TIMEOUT = env.int('USER_ROLES_TIMEOUT', default=60 * 60)
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
@@ -185,6 +190,50 @@ CACHES = {
     }
 }
 
+# Клиент employee
+EMPLOYEE_MAX_CONNECTIONS = env.int('EMPLOYEE_MAX_CONNECTIONS', default=10)
+# Сколько ждать свободного соединения из пула (в секундах)
+EMPLOYEE_POOL_TIMEOUT = env.float('EMPLOYEE_POOL_TIMEOUT', default=30.0)
+# Таймаут ответа employee (в секундах)
+EMPLOYEE_TIMEOUT = env.float('EMPLOYEE_TIMEOUT', default=120.0)
+# Повторы при 5xx и сетевых ошибках, задержка удваивается с каждым повтором (в секундах)
+EMPLOYEE_RETRIES = env.int('EMPLOYEE_RETRIES', default=3)
+# Таймаут (в секундах) и повторы для запросов в employee в рамках запроса пользователя
+EMPLOYEE_REQUEST_TIMEOUT = env.float('EMPLOYEE_REQUEST_TIMEOUT', default=5.0)
+EMPLOYEE_REQUEST_RETRIES = env.int('EMPLOYEE_REQUEST_RETRIES', default=1)
+EMPLOYEE_RETRY_BACKOFF = env.float('EMPLOYEE_RETRY_BACKOFF', default=0.5)
+# После скольких неудачных запросов подряд перестаем ходить в employee и на сколько (в секундах)
+EMPLOYEE_CIRCUIT_FAILURE_THRESHOLD = env.int('EMPLOYEE_CIRCUIT_FAILURE_THRESHOLD', default=5)
+EMPLOYEE_CIRCUIT_RESET_TIMEOUT = env.int('EMPLOYEE_CIRCUIT_RESET_TIMEOUT', default=30)
+
+# Загрузка пользователей из employee: число одновременных запросов, размер пачки при сохранении,
+# время хранения чекпоинта прерванной загрузки (в секундах)
+USERS_SYNC_CONCURRENCY = env.int('USERS_SYNC_CONCURRENCY', default=EMPLOYEE_MAX_CONNECTIONS)
+USERS_SYNC_BATCH_SIZE = env.int('USERS_SYNC_BATCH_SIZE', default=500)
+USERS_SYNC_CHECKPOINT_CACHE_KEY = 'users_sync_checkpoint'
+USERS_SYNC_CHECKPOINT_TIMEOUT = env.int('USERS_SYNC_CHECKPOINT_TIMEOUT', default=60 * 60 * 24 * 2)
+
+# Кэширование ответов employee (в секундах)
+EMPLOYEE_CACHE_TIMEOUTS = {
+    'manager_level': env.int('EMPLOYEE_CACHE_MANAGER_LEVEL_TIMEOUT', default=60 * 60 * 12),
+    'employee/topperformerrate': env.int('EMPLOYEE_CACHE_TOP_PERFORMER_RATE_TIMEOUT', default=60 * 60 * 12),
+    'departments': env.int('EMPLOYEE_CACHE_DEPARTMENTS_TIMEOUT', default=60 * 60 * 6),
+}
+EMPLOYEE_CACHE_DEFAULT_TIMEOUT = env.int('EMPLOYEE_CACHE_DEFAULT_TIMEOUT', default=60 * 60)
+# Сколько после устаревания данные еще отдаются из кэша, пока идет их фоновое обновление
+EMPLOYEE_CACHE_STALE_TIMEOUT = env.int('EMPLOYEE_CACHE_STALE_TIMEOUT', default=60 * 60 * 24)
+# Время хранения пустого ответа employee (сотрудник не найден / сервис недоступен)
+EMPLOYEE_CACHE_NEGATIVE_TIMEOUT = env.int('EMPLOYEE_CACHE_NEGATIVE_TIMEOUT', default=60 * 5)
+EMPLOYEE_CACHE_REFRESH_LOCK_TIMEOUT = env.int('EMPLOYEE_CACHE_REFRESH_LOCK_TIMEOUT', default=60 * 2)
+# Индекс доступности вакансий (в секундах), сбрасывается при изменении вакансий и должностей
+VACANCY_ELIGIBILITY_TIMEOUT = env.int('VACANCY_ELIGIBILITY_TIMEOUT', default=60 * 60 * 24)
+# Счетчики опубликованных вакансий по подразделениям и городам (в секундах)
+VACANCY_COUNTERS_TIMEOUT = env.int('VACANCY_COUNTERS_TIMEOUT', default=60 * 60 * 24)
+# Количество записей в списках с пагинацией (в секундах), сбрасывается при изменении вакансий и откликов
+PAGINATION_COUNT_CACHE_TIMEOUT = env.int('PAGINATION_COUNT_CACHE_TIMEOUT', default=60)
+# Для списков без фильтров от этого количества строк total берется из статистики Postgres (оценка)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = env.int('PAGINATION_COUNT_ESTIMATE_THRESHOLD', default=10000)
+
 # CELERY
 CELERY_TASK_ALWAYS_EAGER = env('CELERY_TASK_ALWAYS_EAGER', cast=bool,
                                default=DEBUG)  # by default in debug mode we run all celery tasks in foregroud.
@@ -192,6 +241,9 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = False
 CELERY_BROKER_URL = REDIS_URL
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Порт, на котором воркер celery отдает свои метрики prometheus (отправка писем, запросы в employee), 0 - не отдавать.
+# Требует переменную окружения PROMETHEUS_MULTIPROC_DIR: процессы воркера пишут метрики в эту директорию
+CELERY_METRICS_PORT = env.int('CELERY_METRICS_PORT', default=0)
 CELERY_BEAT_SCHEDULE = {
     'check_sap_requests_status': {
         'task': 'sap.tasks.check_sap_requests_status',
@@ -237,6 +289,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'sap.tasks.update_work_experiences_from_sap',
         'schedule': crontab(hour=7, minute=0),
     },
+    'dispatch_sap_outbox': {
+        'task': 'sap.tasks.dispatch_sap_outbox',
+        'schedule': timedelta(minutes=1),
+    },
     'delete_successful_saprequests': {
         'task': 'sap.tasks.delete_successful_saprequests',
         'schedule': crontab(day_of_month=1, hour=18, minute=0)
@@ -269,7 +325,25 @@ EMAIL_PORT = env('EMAIL_PORT')
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 EMAIL_SUBJECT_PREFIX = env.str('EMAIL_SUBJECT_PREFIX', default='Карьерные маршруты')
+# Очередь писем: ключ в redis, размер пачки на одно SMTP соединение, интервал отправки (в секундах),
+# повторы письма внутри пачки и количество пачек, в которых письмо пытаемся отправить
+EMAIL_QUEUE_KEY = env.str('EMAIL_QUEUE_KEY', default='email_queue')
+EMAIL_BATCH_SIZE = env.int('EMAIL_BATCH_SIZE', default=50)
+EMAIL_FLUSH_INTERVAL = env.int('EMAIL_FLUSH_INTERVAL', default=30)
+EMAIL_SEND_RETRIES = env.int('EMAIL_SEND_RETRIES', default=2)
+EMAIL_MAX_ATTEMPTS = env.int('EMAIL_MAX_ATTEMPTS', default=5)
+# Таймаут SMTP соединения (в секундах)
+EMAIL_TIMEOUT = env.int('EMAIL_TIMEOUT', default=30)
+# Время жизни блокировки отправки очереди (в секундах), продлевается перед каждым письмом.
+# Должно быть больше времени отправки одного письма с повторами: (EMAIL_SEND_RETRIES + 1) * EMAIL_TIMEOUT
+EMAIL_FLUSH_LOCK_TIMEOUT = env.int('EMAIL_FLUSH_LOCK_TIMEOUT', default=60 * 5)
+CELERY_BEAT_SCHEDULE['flush_email_queue'] = {
+    'task': 'app.tasks.flush_email_queue',
+    'schedule': timedelta(seconds=EMAIL_FLUSH_INTERVAL),
+}
 REMINDER_INTERVAL = env.int('REMINDER_INTERVAL', default=14)  # Интервал в днях, для отправки напоминаний
+# Размер диапазона id шагов, напоминания по которому отправляет одна задача
+REMINDER_SHARD_SIZE = env.int('REMINDER_SHARD_SIZE', default=1000)
 MAIN_SITE_LINK = env.str('MAIN_SITE_LINK', default='')
 INBOX_LINK = f'{MAIN_SITE_LINK}/{env.str("INBOX_LINK", default="department/reply/inbox")}'
 OUTBOX_LINK = f'{MAIN_SITE_LINK}/{env.str("OUTBOX_LINK", default="reply/outbox")}'
@@ -288,6 +362,15 @@ EMAIL_VACANCY_RESERVE = env.str('EMAIL_VACANCY_RESERVE', default='rezerv@megafon
 
 # количество дней, чтобы показывать бейдж New на карточках "Карьера и кофе"
 EMPLOYEE_CARD_NEW_DAYS = env.int('EMPLOYEE_CARD_NEW_DAYS', default=7)
+# Список id для случайной выборки (core.utils.get_random_sample, в секундах)
+RANDOM_SAMPLE_IDS_TIMEOUT = env.int('RANDOM_SAMPLE_IDS_TIMEOUT', default=60 * 60)
+# Таблица результатов теста на тип карьеры (в секундах), сбрасывается при изменении вопросов и результатов
+POLL_RESULT_LOOKUP_TIMEOUT = env.int('POLL_RESULT_LOOKUP_TIMEOUT', default=60 * 60 * 24)
+# Данные главной страницы (в секундах), не дольше срока действия подписанных ссылок на изображения в S3
+MAIN_PAGE_CACHE_TIMEOUT = env.int('MAIN_PAGE_CACHE_TIMEOUT', default=60 * 30)
+
+# Размер пачки строк при загрузке файла должностей и подразделений (InfoFile)
+INFO_FILE_BATCH_SIZE = env.int('INFO_FILE_BATCH_SIZE', default=1000)
 
 # количество фотографий на баннере на главной странице
 NUM_OF_BANNER_IMAGES = env.int('NUM_OF_BANNER_IMAGES', default=22)
@@ -303,6 +386,18 @@ SAP_HR_VACANCY_EXTEND_ENDPOINT = env('SAP_HR_VACANCY_EXTEND_ENDPOINT',
                                      default='RESTAdapter/CareerRoutes/VacancyExtend')
 
 SAP_HR_CANDIDATE_ENDPOINT = env('SAP_HR_CANDIDATE_ENDPOINT', default='RESTAdapter/CareerRoutes/Candidate')
-SAP_DATA_BATCH_SIZE = env.int('SAP_DATA_BATCH_SIZE', default=25)
+# Размер пачки bulk_create/bulk_update при загрузке справочников SAP
+SAP_DATA_BATCH_SIZE = env.int('SAP_DATA_BATCH_SIZE', default=500)
+# Очередь сообщений в SAP: размер пачки, параллельные запросы, попытки,
+# базовая задержка повтора и интервал опроса очереди (в секундах)
+SAP_OUTBOX_BATCH_SIZE = env.int('SAP_OUTBOX_BATCH_SIZE', default=50)
+SAP_OUTBOX_CONCURRENCY = env.int('SAP_OUTBOX_CONCURRENCY', default=5)
+SAP_OUTBOX_MAX_ATTEMPTS = env.int('SAP_OUTBOX_MAX_ATTEMPTS', default=8)
+SAP_OUTBOX_RETRY_BACKOFF = env.int('SAP_OUTBOX_RETRY_BACKOFF', default=30)
+SAP_OUTBOX_POLL_INTERVAL = env.int('SAP_OUTBOX_POLL_INTERVAL', default=5)
+# Через сколько (в секундах) сообщение, взятое в отправку, считается брошенным (диспетчер упал) и отправляется снова
+SAP_OUTBOX_SENDING_TIMEOUT = env.int('SAP_OUTBOX_SENDING_TIMEOUT', default=60 * 10)
+# Размер куска резюме, который читается из хранилища и кодируется в base64 при отправке в SAP (в байтах)
+SAP_ATTACHMENT_CHUNK_SIZE = env.int('SAP_ATTACHMENT_CHUNK_SIZE', default=256 * 1024)
 SAP_REPLY_REJECT_COMMENT = env('SAP_REPLY_REJECT_COMMENT',
                                default='Отклонено по результатам рассмотрения в системе SAP')
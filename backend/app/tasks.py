@@ -1,10 +1,11 @@
 import logging
 from typing import List
 
+from django.apps import apps
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 
 from app.celery import celery
+from app.mail import EmailQueue
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +14,7 @@ logger = logging.getLogger(__name__)
 def send_templated_email(recipients: list, text_context: str, subject: str,
                          html_context: str = None, attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER):
     """
-    Задача в Celery, для отправки email
+    Задача в Celery, для отправки email. Письмо ставится в очередь и уходит со следующей пачкой (app.mail.EmailQueue)
     :param recipients: список email получателей
     :param text_context: текстовый шаблон
     :param html_context: html шаблон
@@ -25,14 +26,30 @@ def send_templated_email(recipients: list, text_context: str, subject: str,
     if not settings.EMAIL_ENABLE:
         return
 
-    msg = EmailMultiAlternatives(subject, text_context, _from, recipients)
+    queue = EmailQueue()
+    queue_size = queue.push(queue.make_message(recipients, text_context, subject, html_context, attachments, _from))
+    if queue_size >= settings.EMAIL_BATCH_SIZE:
+        flush_email_queue.delay()
 
-    if html_context:
-        msg.attach_alternative(html_context, 'text/html')
 
-    if attachments:
-        for attachment in attachments:
-            msg.attach(*attachment)
+@celery.task
+def flush_email_queue():
+    """Отправляет накопленные письма пачками через одно SMTP соединение"""
+    EmailQueue().flush()
+
+
+@celery.task
+def render_and_send_templated_email(recipients: list, template: str, subject: str, model_label: str, pk: int,
+                                    attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER):
+    """
+    Задача в Celery, для рендеринга и отправки email, контекст собирается методом get_email_context модели.
+    Скомпилированные шаблоны кеширует django (cached loader при DEBUG=False), в воркере каждый шаблон
+    компилируется один раз.
+    """
+    from app.utils import render_templated_email
 
-    logger.info(f'Sending email to: {recipients}, subject: {subject}, from: {_from}')
-    msg.send()
+    context = apps.get_model(model_label).get_email_context(pk)
+    rendered = render_templated_email(template, subject, context)
+    if rendered:
+        text_context, html_context, subject = rendered
+        send_templated_email(recipients, text_context, subject, html_context, attachments, _from)
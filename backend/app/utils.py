@@ -1,40 +1,36 @@
 import logging
-from typing import List
+from typing import List, Optional, Tuple
 
 from django.conf import settings
+from django.db import transaction
 from django.template.exceptions import TemplateDoesNotExist, TemplateSyntaxError
 from django.template.loader import get_template
 
-from app.tasks import send_templated_email
+from app.mail import EmailQueue
+from app.tasks import (
+    flush_email_queue,
+    render_and_send_templated_email,
+    send_templated_email
+)
 
 logger = logging.getLogger(__name__)
 
 
-def prepare_and_send_templated_email(recipients: list, template: str, subject: str, context: dict,
-                                     attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER):
+def render_templated_email(template: str, subject: str, context: dict) -> Optional[Tuple[str, str, str]]:
     """
-    Производит рендеринг шаблона письма и запускает задачу в Celery, для отправки email
-    :param recipients: список email получателей
-    :param context: словарь данных для рендеринга шаблона
-    :param template: путь к шаблону без расширения (модуль сам подставит расширения txt, html и попытается найти шаблон)
-    :param attachments: вложения к письму - список кортежей (filename, content)
-    :param subject: заголовок письма
-    :param _from: от кого письмо
-    :return: None
+    Рендеринг шаблона письма
+    :return: текст письма, html письма (или None) и заголовок с префиксом; None, если текстового шаблона нет
     """
-    if not settings.EMAIL_ENABLE:
-        return
-
     html_context = None
 
     try:
         text_context = get_template(f'{template}.txt').render(context)
     except TemplateDoesNotExist:
         logger.error(f'Шаблон {template}.txt не найден')
-        return
+        return None
     except TemplateSyntaxError as error:
         logger.error(f'Шаблон {template}.txt имеет синтаксические ошибки. {error}')
-        return
+        return None
 
     try:
         html_context = get_template(f'{template}.html').render(context)
@@ -45,4 +41,60 @@ def prepare_and_send_templated_email(recipients: list, template: str, subject: s
         if subject:
             subject = f'{settings.EMAIL_SUBJECT_PREFIX} - {subject}'
 
-    send_templated_email.delay(recipients, text_context, subject, html_context, attachments, _from)
+    return text_context, html_context, subject
+
+
+def prepare_and_send_templated_email(recipients: list, template: str, subject: str, context: dict,
+                                     attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER):
+    """
+    Производит рендеринг шаблона письма и запускает задачу в Celery, для отправки email
+    :param recipients: список email получателей
+    :param context: словарь данных для рендеринга шаблона
+    :param template: путь к шаблону без расширения (модуль сам подставит расширения txt, html и попытается найти шаблон)
+    :param attachments: вложения к письму - список кортежей (filename, content)
+    :param subject: заголовок письма
+    :param _from: от кого письмо
+    :return: None
+    """
+    if not settings.EMAIL_ENABLE:
+        return
+
+    rendered = render_templated_email(template, subject, context)
+    if rendered:
+        text_context, html_context, subject = rendered
+        send_templated_email.delay(recipients, text_context, subject, html_context, attachments, _from)
+
+
+def send_deferred_templated_email(recipients: list, template: str, subject: str, model_label: str, pk: int,
+                                  attachments: List[tuple] = None, _from: str = settings.EMAIL_SENDER):
+    """
+    Запускает задачу в Celery, которая соберет контекст, отрендерит шаблон и отправит email.
+    В запросе не загружаются связанные объекты и не рендерятся шаблоны, задача ставится после коммита транзакции.
+    :param model_label: модель, которая собирает контекст письма (app_label.ModelName с методом get_email_context(pk))
+    :param pk: id объекта модели
+    Остальные параметры - как в prepare_and_send_templated_email
+    """
+    if not settings.EMAIL_ENABLE:
+        return
+
+    transaction.on_commit(lambda: render_and_send_templated_email.delay(
+        recipients, template, subject, model_label, pk, attachments, _from
+    ))
+
+
+def prepare_and_send_templated_emails(emails: List[Tuple[list, str, str, dict]], _from: str = settings.EMAIL_SENDER):
+    """
+    Рендеринг и постановка в очередь отправки нескольких писем одним запросом в redis, для массовых рассылок из задач
+    :param emails: список (получатели, шаблон, заголовок, контекст)
+    """
+    if not settings.EMAIL_ENABLE:
+        return
+
+    messages = []
+    for recipients, template, subject, context in emails:
+        rendered = render_templated_email(template, subject, context)
+        if rendered:
+            text_context, html_context, subject = rendered
+            messages.append(EmailQueue.make_message(recipients, text_context, subject, html_context, None, _from))
+    if messages and EmailQueue().push(*messages) >= settings.EMAIL_BATCH_SIZE:
+        flush_email_queue.delay()
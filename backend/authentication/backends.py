@@ -1,6 +1,10 @@
+import hashlib
+import time
+
 import jwt
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from jwt import PyJWTError
 from rest_framework.authentication import BaseAuthentication, SessionAuthentication
 from rest_framework.exceptions import AuthenticationFailed
@@ -11,6 +15,11 @@ UserModel = get_user_model()
 
 
 class JWTSSOBackend(BaseAuthentication):
+    """Аутентификация по JWT SSO.
+    id пользователя кэшируется по хэшу токена (и его данных) до истечения токена, но не дольше JWT_AUTH_CACHE_TIMEOUT,
+    повторные запросы с тем же токеном не декодируют его и загружают пользователя одним запросом по pk.
+    Роли берутся из снимка ролей (User.get_roles).
+    """
 
     def authenticate(self, request, **kwargs):
         try:
@@ -18,6 +27,13 @@ class JWTSSOBackend(BaseAuthentication):
             if prefix != 'Bearer':
                 return None
 
+            cache_key = self.get_cache_key(token)
+            user_id = cache.get(cache_key)
+            if user_id:
+                user = UserModel.objects.filter(pk=user_id).first()
+                if user:
+                    return user, token
+
             data = jwt.decode(
                 token.encode(),
                 settings.JWT_SECRET_KEY,
@@ -39,13 +55,30 @@ class JWTSSOBackend(BaseAuthentication):
             if created:
                 update_user_data.delay(personnel_number=user.personnel_number)
 
+            timeout = self.get_cache_timeout(data)
+            if timeout > 0:
+                cache.set(cache_key, user.pk, timeout=timeout)
+
             return user, token
 
         except (ValueError, KeyError, PyJWTError):
             raise AuthenticationFailed()
 
+    @staticmethod
+    def get_cache_key(token: str) -> str:
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        return f'jwt_auth:{token_hash}'
+
+    @staticmethod
+    def get_cache_timeout(data: dict) -> int:
+        timeout = settings.JWT_AUTH_CACHE_TIMEOUT
+        if data.get('exp'):
+            timeout = min(timeout, int(data['exp'] - time.time()))
+        return timeout
+
     def configure_user(self, user, **kwargs):
-        changed = False
+        """Обновляет данные пользователя из токена, сохраняет только изменившиеся поля."""
+        changed = []
         attr_map = {
             settings.JWT_USERNAME: 'username',
             settings.JWT_EMAIL: 'email',
@@ -55,9 +88,9 @@ class JWTSSOBackend(BaseAuthentication):
         for key, value in attr_map.items():
             if kwargs.get(key) and getattr(user, value) != kwargs.get(key):
                 setattr(user, value, kwargs.get(key))
-                changed = True
+                changed.append(value)
         if changed:
-            user.save()
+            user.save(update_fields=changed + ['modified'])
         return user
 
 
@@ -1,17 +1,19 @@
 import logging
-import time
-from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 from django.conf import settings
 from django.db import models
-from django.db.models import Count, Q
 from mptt.models import MPTTModel, TreeForeignKey, TreeManager
 from mptt.querysets import TreeQuerySet
 
 from app.models import IsActiveMixin, TimestampedModel
 from company.enums import SelectionTypeChoices
-from core.utils import file_path, get_employee_data
-from vacancies.enums import VacancyStatusChoices
+from core.clients import get_employee_client
+from core.utils import file_path
+
+if TYPE_CHECKING:
+    from company.tree import UnitNode
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +74,90 @@ class UnitManager(TreeManager):
             is_active=True
         ).update(is_active=False)
 
+    def import_from_employee(self, departments_data: List[dict]) -> int:
+        """Загружает подразделения из employee (данные UnitEmployeeSerializer).
+        Сравнивает выгрузку с имеющимися подразделениями и сохраняет только изменившиеся,
+        поля дерева (lft, rght, tree_id, level) пересчитываются в памяти за один проход вместо rebuild().
+        Возвращает количество сохраненных подразделений.
+        """
+        user_model = self.model._meta.get_field('manager').related_model
+        units = {unit.code: unit for unit in self.all()}
+
+        # Создаем отсутствующие подразделения и родителей, которых нет в выгрузке
+        new_codes = {data['code'] for data in departments_data} | {
+            data['parent_id'] for data in departments_data if data.get('parent_id')
+        }
+        new_units = [
+            self.model(code=code, name='', lft=0, rght=0, tree_id=0, level=0)
+            for code in new_codes - units.keys()
+        ]
+        self.bulk_create(new_units)
+        units.update({unit.code: unit for unit in new_units})
+
+        managers_personnel_numbers = {data['manager_id'] for data in departments_data if data.get('manager_id')}
+        managers = user_model.objects.in_bulk(list(managers_personnel_numbers), field_name='personnel_number')
+        if managers_personnel_numbers - managers.keys():
+            user_model.objects.bulk_create(
+                [user_model(personnel_number=pn) for pn in managers_personnel_numbers - managers.keys()],
+                ignore_conflicts=True
+            )
+            managers = user_model.objects.in_bulk(list(managers_personnel_numbers), field_name='personnel_number')
+
+        changed = {unit.id for unit in new_units}
+        changed_managers = set()
+        for data in departments_data:
+            unit = units[data['code']]
+            values = {'name': data['name']}
+            # Родитель и руководитель обновляются, только если переданы
+            if data.get('parent_id'):
+                values['parent_id'] = units[data['parent_id']].id
+            if data.get('manager_id'):
+                values['manager_id'] = managers[data['manager_id']].id
+            for field, value in values.items():
+                if getattr(unit, field) != value:
+                    if field == 'manager_id':
+                        changed_managers.update((unit.manager_id, value))
+                    setattr(unit, field, value)
+                    changed.add(unit.id)
+
+        changed.update(self.calculate_tree_fields(units.values()))
+        changed_units = [unit for unit in units.values() if unit.id in changed]
+        self.bulk_update(
+            changed_units, fields=['name', 'parent', 'manager', 'lft', 'rght', 'tree_id', 'level'], batch_size=1000
+        )
+        # bulk_update не отправляет сигналы, а руководитель подразделения - всегда менеджер
+        user_model.invalidate_roles(*changed_managers)
+        return len(changed_units)
+
+    @staticmethod
+    def calculate_tree_fields(units) -> set:
+        """Проставляет подразделениям lft, rght, tree_id, level по parent_id (как rebuild() - по порядку id).
+        Возвращает id подразделений, у которых изменились поля дерева.
+        """
+        children = {}
+        for unit in sorted(units, key=lambda unit: unit.id):
+            children.setdefault(unit.parent_id, []).append(unit)
+        changed = set()
+        for tree_id, root in enumerate(children.get(None, []), start=1):
+            counter = 1
+            # Обход в глубину без рекурсии: (подразделение, уровень, обработаны ли дети)
+            stack = [(root, 0, False)]
+            while stack:
+                unit, level, visited = stack.pop()
+                if not visited:
+                    fields = {'tree_id': tree_id, 'level': level, 'lft': counter}
+                    counter += 1
+                    stack.append((unit, level, True))
+                    stack.extend((child, level + 1, False) for child in reversed(children.get(unit.id, [])))
+                else:
+                    fields = {'rght': counter}
+                    counter += 1
+                for field, value in fields.items():
+                    if getattr(unit, field) != value:
+                        setattr(unit, field, value)
+                        changed.add(unit.id)
+        return changed
+
 
 class Unit(MPTTModel, IsActiveMixin):
     objects = UnitManager.from_queryset(UnitQueryset)()
@@ -103,20 +189,24 @@ class Unit(MPTTModel, IsActiveMixin):
         return f'Подразделение {self.name}'
 
     @property
-    def chain(self) -> TreeQuerySet:
-        """Цепочка подразделений."""
-        return self.get_ancestors(include_self=True)
+    def chain(self) -> List['UnitNode']:
+        """Цепочка подразделений (из дерева подразделений в памяти)."""
+        from company.tree import UnitTree
+        return UnitTree.get().get_chain(self.id)
 
     @property
     def users_and_managers(self) -> models.QuerySet:
         """Список сотрудников подразделения + вышестоящие руководители.
         Берем сотрудников депатрамента + руководителей родительских подразделений до level=2.
         Отдаем сначала рук-лей, потом сотрудников депатрамента в алфавитном порядке.
+        Признаки ролей добавлены в queryset (UserQuerySet.with_roles), т.к. после union их не добавить.
         """
+        from company.tree import UnitTree
         from users.models import User
-        return self.users.all().with_user_full_name().with_is_unit_manager().union(
-            User.objects.with_user_full_name().with_is_unit_manager().filter(
-                subordinate_units__in=self.get_ancestors().filter(level__gt=2)
+        ancestor_ids = [unit.id for unit in UnitTree.get().get_ancestors(self.id) if unit.level > 2]
+        return self.users.all().with_user_full_name().with_roles().union(
+            User.objects.with_user_full_name().with_roles().filter(
+                subordinate_units__in=ancestor_ids
             )
         ).order_by('-is_unit_manager', 'user_full_name')
 
@@ -137,13 +227,6 @@ class Unit(MPTTModel, IsActiveMixin):
             units[index] = parent = unit
         return units
 
-    def get_num_vacancies_from_descendants(self) -> int:
-        """Общее количество вакансий со всех дочерних подразделений
-        """
-        return self.get_descendants(include_self=True).aggregate(
-            num=Count('vacancies', filter=Q(vacancies__status=VacancyStatusChoices.PUBLISHED))
-        )['num']
-
 
 class Position(IsActiveMixin):
     name = models.CharField(verbose_name='Название', max_length=512)
@@ -220,49 +303,105 @@ class InfoFile(TimestampedModel):
     def __str__(self):
         return self.file.name
 
-    def connect_position_to_unit(
-            self, position: str, level: str, code: Optional[Union[int, str]]
-    ) -> Position:
-        """Связывает должность с подразделением.
-        :param position: Должность
-        :param level: Карьерный уровень должности
-        :param code: Код подразделения
-
-        :return Position: Возвращает объект созданной должности
-        """
-        code = str(code)
-        # Ищем подразделение по коду, если не нашли - идем на эмплои
-        if not Unit.objects.filter(code=code).exists():
-            data = get_employee_data('departments', params={'department_id': code})
-            Unit.load_from_chain(data)
-
-        unit = Unit.objects.get(code=code)
-
-        position = Position.objects.get_or_create(name=position, level=level)[0]
-        position.units.add(unit)
-
-        return position
-
-    def parse_positions_and_units(self):
+    def parse_positions_and_units(self) -> dict:
         """Парсер csv файла со списком должностей и подразделений.
         Должность|Код подразделения|Карьерный уровень начальной должности|...
         ...Целевая должность|Код подразделения|Карьерный уровень целевой должности|
+
+        Файл читается из хранилища построчно и обрабатывается пачками по INFO_FILE_BATCH_SIZE строк.
+        Должности ищутся по названию в подразделении, им проставляется карьерный уровень и целевые должности.
+        Возвращает итог загрузки: количество строк, новых целевых должностей, обновленных уровней и ошибки.
         """
-        start = time.time()
-        with self.file.open() as file:
-            logging.info(f'Load info from {self.file.name}.')
-            line_number = 1
-            file.readline()  # Пропускаем первую строку с названием полей
-
-            for line in file.readlines():
-                line_number += 1
-                logger.info(f'Importing {line_number} line. Time: {time.time() - start}')
-                line = line.decode('utf-8').strip('\n').split('|')
-                position, code, level = line[0], line[1], line[2]
-                target_position, target_code, target_level = line[3], line[4], line[5]
-                try:
-                    position = self.connect_position_to_unit(position, level, code)
-                    target_position = self.connect_position_to_unit(target_position, target_level, target_code)
-                    PositionToTargetPosition.objects.get_or_create(position=position, target=target_position)
-                except Exception as e:
-                    logger.error(f'Error while loading file on line {line_number}: {e}')
+        summary = {'lines': 0, 'targets_created': 0, 'levels_updated': 0, 'errors': []}
+        with self.file.open('rb') as file:
+            logger.info(f'Load info from {self.file.name}.')
+            lines = iter(file)
+            next(lines, None)  # Пропускаем первую строку с названием полей
+            batch = []
+            for line_number, line in enumerate(lines, start=2):
+                batch.append((line_number, line.decode('utf-8').rstrip('\r\n').split('|')))
+                if len(batch) >= settings.INFO_FILE_BATCH_SIZE:
+                    self.import_batch(batch, summary)
+                    batch = []
+            if batch:
+                self.import_batch(batch, summary)
+        logger.info(
+            f'{self.file.name} загружен. Строк: {summary["lines"]}, новых целевых должностей: '
+            f'{summary["targets_created"]}, обновлено уровней: {summary["levels_updated"]}, '
+            f'ошибок: {len(summary["errors"])}.'
+        )
+        if summary['errors']:
+            logger.error('Ошибки загрузки {}:\n{}'.format(self.file.name, '\n'.join(summary['errors'])))
+        return summary
+
+    @staticmethod
+    def get_units(codes: set) -> Dict[str, Unit]:
+        """Подразделения по кодам. Отсутствующие в базе загружаются из employee параллельно."""
+        units = Unit.objects.in_bulk(list(codes), field_name='code')
+        missing_codes = codes - units.keys()
+        if missing_codes:
+            with ThreadPoolExecutor(max_workers=settings.EMPLOYEE_MAX_CONNECTIONS) as executor:
+                chains = list(executor.map(
+                    lambda code: get_employee_client().get('departments', params={'department_id': code}),
+                    missing_codes
+                ))
+            for chain in chains:
+                Unit.load_from_chain(chain)
+            units.update(Unit.objects.in_bulk(list(missing_codes), field_name='code'))
+        return units
+
+    def import_batch(self, batch: List[Tuple[int, List[str]]], summary: dict):
+        rows = []
+        for line_number, line in batch:
+            if len(line) < 6:
+                summary['errors'].append(f'Строка {line_number}: ожидается 6 полей, получено {len(line)}')
+                continue
+            rows.append((line_number, (line[0], line[1], line[2]), (line[3], line[4], line[5])))
+        summary['lines'] += len(batch)
+
+        units = self.get_units({code for _, *row_positions in rows for _, code, _ in row_positions})
+        positions = {}
+        for position in Position.objects.filter(
+                unit__in=units.values(), name__in={name for _, *row_positions in rows for name, _, _ in row_positions}
+        ):
+            positions.setdefault((position.unit_id, position.name), []).append(position)
+
+        levels = {}
+        links = set()
+        for line_number, *row_positions in rows:
+            found = []
+            for name, code, level in row_positions:
+                unit = units.get(code)
+                if not unit:
+                    summary['errors'].append(f'Строка {line_number}: подразделение {code} не найдено')
+                    break
+                if (unit.id, name) not in positions:
+                    summary['errors'].append(f'Строка {line_number}: должность "{name}" в подразделении {code} не найдена')
+                    break
+                for position in positions[(unit.id, name)]:
+                    levels[position.id] = (position, level)
+                found.append(positions[(unit.id, name)])
+            else:
+                current_positions, target_positions = found
+                links.update(
+                    (position.id, target.id) for position in current_positions for target in target_positions
+                )
+
+        changed_positions = []
+        for position, level in levels.values():
+            if position.level != level:
+                position.level = level
+                changed_positions.append(position)
+        Position.objects.bulk_update(changed_positions, fields=['level'])
+        summary['levels_updated'] += len(changed_positions)
+
+        existing_links = set(PositionToTargetPosition.objects.filter(
+            position_id__in={position_id for position_id, _ in links}
+        ).values_list('position_id', 'target_id'))
+        new_links = [
+            PositionToTargetPosition(position_id=position_id, target_id=target_id)
+            for position_id, target_id in links - existing_links
+        ]
+        PositionToTargetPosition.objects.bulk_create(new_links)
+        summary['targets_created'] += len(new_links)
+        logger.info(f'{self.file.name}: обработано {summary["lines"]} строк.')
@@ -1,8 +1,8 @@
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from company.models import City, Office, Position, Unit
-from users.models import User
-from vacancies.models import VacancyToOffice
+from company.tree import UnitTree
 
 
 class CitySerializer(serializers.ModelSerializer):
@@ -26,9 +26,12 @@ class UnitSerializer(serializers.ModelSerializer):
         model = Unit
         fields = ('name', 'code', 'parent_code')
 
+    @cached_property
+    def unit_tree(self) -> UnitTree:
+        return UnitTree.get()
+
     def get_parent_code(self, instance):
-        parent = instance.get_ancestors().last()
-        return parent.code if parent else None
+        return self.unit_tree.get_parent_code(instance.id)
 
 
 class DepartmentSerializer(UnitSerializer):
@@ -68,14 +71,12 @@ class OfficeSerializer(serializers.ModelSerializer):
 
 
 class OfficeInVacancyDescriptionSerializer(OfficeSerializer):
-    is_main = serializers.SerializerMethodField()
+    """Ожидает офисы с проставленным is_main из VacancyToOffice (см. VacancySerializer.get_offices)."""
+    is_main = serializers.BooleanField(read_only=True)
 
     class Meta(OfficeSerializer.Meta):
         fields = ('id', 'city', 'street', 'is_main')
 
-    def get_is_main(self, instance):
-        return VacancyToOffice.objects.get(office=instance, vacancy=self.context['vacancy']).is_main
-
 
 class UnitEmployeeSerializer(serializers.Serializer):
     code = serializers.CharField()
@@ -86,34 +87,6 @@ class UnitEmployeeSerializer(serializers.Serializer):
     class Meta:
         fields = ('code', 'parent_id', 'name', 'manager_id')
 
-    def prepare_data(self, data):
-        validated_data = data.copy()
-        parent_id = validated_data.pop('parent_id', None)
-        manager_personnel_number = validated_data.pop('manager_id', None)
-        extend_data = {}
-        if parent_id:
-            parent_obj, _ = Unit.objects.get_or_create(code=parent_id)
-            extend_data['parent'] = parent_obj
-        if manager_personnel_number:
-            manager_obj, _ = User.objects.get_or_create(personnel_number=manager_personnel_number)
-            extend_data['manager'] = manager_obj
-        validated_data.update(extend_data)
-        return validated_data
-
-    def update(self, instance, validated_data):
-        data = self.prepare_data(validated_data)
-        return super().update(instance, data)
-
-    def create(self, validated_data):
-        data = self.prepare_data(validated_data)
-        code = data.pop('code')
-        instance, created = Unit.objects.update_or_create(
-            code=code,
-            defaults=data
-        )
-        self.context.update({'instance_created': created})
-        return instance
-
 
 class PositionEmployeeSerializer(serializers.Serializer):
     code = serializers.CharField()
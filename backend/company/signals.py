@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from company.models import Unit
+from company.tree import UnitTree
+
+
+@receiver([post_save, post_delete], sender=Unit)
+def invalidate_unit_tree(sender, **kwargs):
+    """Сбрасывает дерево подразделений в памяти процессов."""
+    UnitTree.invalidate()
@@ -6,7 +6,9 @@ from django.db import transaction
 from app.celery import celery
 from company.models import InfoFile, Position, Unit
 from company.serializers import PositionEmployeeSerializer, UnitEmployeeSerializer
-from core.utils import get_employee_data
+from company.tree import UnitTree
+from core.clients import get_employee_client
+from vacancies.models import Vacancy
 
 UserModel = get_user_model()
 logger = logging.getLogger(__name__)
@@ -16,22 +18,22 @@ logger = logging.getLogger(__name__)
 def upload_positions_and_units(file_id: int):
     file = InfoFile.objects.get(id=file_id)
     file.parse_positions_and_units()
+    # bulk-операции не отправляют сигналы
+    Vacancy.invalidate_eligibility_index()
 
 
 @celery.task
 def load_units_data_from_employee():
-    response_data = get_employee_data(url='departments/odata')
+    response_data = get_employee_client().get(url='departments/odata')
     departments_data = response_data.get('data', []) if response_data else []
     if departments_data:
-        with transaction.atomic():  # https://django-mptt.readthedocs.io/en/stable/mptt.managers.html#mptt.managers.TreeManager.disable_mptt_updates
-
-            with Unit.objects.disable_mptt_updates():
-                serializer = UnitEmployeeSerializer(data=departments_data, many=True)
-                serializer.is_valid(raise_exception=True)
-                serializer.save()
-            Unit.objects.rebuild()
-
+        serializer = UnitEmployeeSerializer(data=departments_data, many=True)
+        serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
+        with transaction.atomic():
+            row = Unit.objects.import_from_employee(validated_data)
+        logger.info(f'Обновлено {row} департаментов.')
+
         unit_codes = [x['code'] for x in validated_data]
         row = Unit.objects.exclude(
             code__in=unit_codes
@@ -41,13 +43,17 @@ def load_units_data_from_employee():
         logger.info(f'Деактивировано {row} отсутствующих в выгрузке департаментов.')
         row = Unit.objects.deactivate_not_company()
         logger.info(f'Деактивировано {row} департаментов вне дерева МегаФон.')
+        UnitTree.invalidate()
+        Vacancy.invalidate_eligibility_index()
+        Vacancy.invalidate_published_counters()
+        UserModel.invalidate_all_roles()
     else:
         logger.info('Нет данных для обновления.')
 
 
 @celery.task
 def load_positions_data_from_employee():
-    response_data = get_employee_data(url='positions')
+    response_data = get_employee_client().get(url='positions')
     positions_data = response_data.get('data', []) if response_data else []
     if positions_data:
         serializer = PositionEmployeeSerializer(data=positions_data, many=True)
@@ -61,5 +67,6 @@ def load_positions_data_from_employee():
             is_active=True
         ).update(is_active=False)
         logger.info(f'Деактивировано {row} должностей.')
+        Vacancy.invalidate_eligibility_index()
     else:
         logger.info('Нет данных для обновления.')
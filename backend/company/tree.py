@@ -0,0 +1,89 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import transaction
+
+from company.models import Unit
+from core.utils import bump_cache_version, get_cache_version
+
+UNIT_TREE_VERSION_KEY = 'unit_tree_version'
+
+
+class UnitNode(NamedTuple):
+    id: int
+    code: str
+    name: str
+    parent_id: Optional[int]
+    tree_id: int
+    lft: int
+    rght: int
+    level: int
+
+
+class UnitTree:
+    """Дерево подразделений в памяти процесса.
+    Загружается одним запросом и перестраивается, когда меняется версия в кэше (UNIT_TREE_VERSION_KEY),
+    те на каждое обращение приходится один GET в redis вместо запросов к таблице подразделений.
+    Родитель и цепочка считаются за O(глубины), потомки - по lft/rght за O(log n + количество потомков).
+    """
+    _current: Optional['UnitTree'] = None
+
+    def __init__(self, nodes: Iterable[UnitNode], version: str):
+        self.version = version
+        self.nodes: Dict[int, UnitNode] = {}
+        self.codes: Dict[str, UnitNode] = {}
+        self.trees: Dict[int, List[UnitNode]] = {}
+        for node in sorted(nodes, key=lambda node: (node.tree_id, node.lft)):
+            self.nodes[node.id] = node
+            self.codes[node.code] = node
+            self.trees.setdefault(node.tree_id, []).append(node)
+        self.lfts = {tree_id: [node.lft for node in nodes] for tree_id, nodes in self.trees.items()}
+
+    @classmethod
+    def get(cls) -> 'UnitTree':
+        version = get_cache_version(UNIT_TREE_VERSION_KEY)
+        tree = cls._current
+        if tree is None or tree.version != version:
+            tree = cls(
+                (UnitNode(*row) for row in Unit.objects.values_list(*UnitNode._fields).iterator()), version
+            )
+            cls._current = tree
+        return tree
+
+    @staticmethod
+    def invalidate():
+        bump_cache_version(UNIT_TREE_VERSION_KEY)
+        # Повторно после коммита, чтобы дерево, собранное до коммита, не осталось в процессах
+        transaction.on_commit(lambda: bump_cache_version(UNIT_TREE_VERSION_KEY))
+
+    def get_by_code(self, code: str) -> Optional[UnitNode]:
+        return self.codes.get(code)
+
+    def get_parent(self, unit_id: int) -> Optional[UnitNode]:
+        node = self.nodes.get(unit_id)
+        return self.nodes.get(node.parent_id) if node and node.parent_id else None
+
+    def get_parent_code(self, unit_id: int) -> Optional[str]:
+        parent = self.get_parent(unit_id)
+        return parent.code if parent else None
+
+    def get_chain(self, unit_id: int) -> List[UnitNode]:
+        """Цепочка подразделений от корня до подразделения включительно."""
+        chain = []
+        node = self.nodes.get(unit_id)
+        while node:
+            chain.append(node)
+            node = self.nodes.get(node.parent_id)
+        return chain[::-1]
+
+    def get_ancestors(self, unit_id: int) -> List[UnitNode]:
+        return self.get_chain(unit_id)[:-1]
+
+    def get_descendant_ids(self, unit_id: int, include_self: bool = False) -> List[int]:
+        node = self.nodes.get(unit_id)
+        if not node:
+            return []
+        lfts = self.lfts[node.tree_id]
+        start = bisect_left(lfts, node.lft) if include_self else bisect_right(lfts, node.lft)
+        end = bisect_right(lfts, node.rght)
+        return [descendant.id for descendant in self.trees[node.tree_id][start:end]]
@@ -10,6 +10,7 @@ from company.serializers import (
     PositionSerializer,
     UnitSerializer
 )
+from company.tree import UnitTree
 from core.enums import CAREER_TYPE_MAP
 from users.models import User
 from users.permissions import IsHeadHR, IsHR, IsManager
@@ -43,11 +44,25 @@ class CompanyCitiesView(generics.ListAPIView):
         if unit_code:
             q &= Q(offices__vacancies__status=VacancyStatusChoices.PUBLISHED)
             if not unit_code == 'all':
-                units_ids = Unit.objects.filter(code=unit_code).get_descendants(include_self=True).values_list('id', flat=True)
+                unit_tree = UnitTree.get()
+                unit = unit_tree.get_by_code(unit_code)
+                units_ids = unit_tree.get_descendant_ids(unit.id, include_self=True) if unit else []
                 q &= Q(offices__vacancies__unit_id__in=units_ids)
-        return City.objects.prefetch_related('offices').filter(q).annotate(
-            total_vacancies=Count('offices__vacancies', filter=Q(offices__vacancies__status=VacancyStatusChoices.PUBLISHED))
-        ).order_by('name')
+        cities = City.objects.filter(q).order_by('name')
+        if type or (unit_code and unit_code != 'all'):
+            # Счетчики не учитывают фильтры по типу вакансий и подразделению, поэтому считаем по отфильтрованным
+            return cities.annotate(total_vacancies=Count(
+                'offices__vacancies',
+                filter=Q(offices__vacancies__status=VacancyStatusChoices.PUBLISHED),
+                distinct=True,
+            ))
+        cities = list(cities.distinct())
+        city_counters = Vacancy.get_published_counters()['cities']
+        # В счетчиках есть количество по каждому карьерному типу
+        counter_key = career or 'total'
+        for city in cities:
+            city.total_vacancies = city_counters.get(city.id, {}).get(counter_key, 0)
+        return cities
 
 
 class CompanyUnitsView(generics.ListAPIView):
@@ -68,8 +83,9 @@ class CompanyUnitsView(generics.ListAPIView):
         if query:
             return Unit.objects.filter(Q(name__icontains=query) | Q(code=query))
         if unit_code:
-            unit_qs = Unit.objects.filter(code=unit_code)
-            return unit_qs.first().chain if unit_qs else unit_qs
+            unit_tree = UnitTree.get()
+            unit = unit_tree.get_by_code(unit_code)
+            return unit_tree.get_chain(unit.id) if unit else []
         if level:
             return Unit.objects.filter(level=int(level))
         return Unit.objects.exclude(positions__isnull=True)
@@ -86,29 +102,19 @@ class DepartmentsView(generics.ListAPIView):
         city_id = self.request.query_params.get('city_id')
         career = self.request.query_params.get('career')
 
-        q = Q()
-
+        units = Unit.objects.departments().exclude(code=user_department_code)
         if city_id:
-            q &= Q(children__vacancies__offices__city__id=city_id)
-
-        if career:
-            # Используем пробел в качестве дефолтного значения, поскольку
-            # в уровнях должностей нет пробела, поэтому фильтрация вернет пустой кверисет
-            q &= Q(children__vacancies__position__level__icontains=CAREER_TYPE_MAP.get(career, ' '))
-
-        q &= ~Q(children__vacancies__status__in=(
-            VacancyStatusChoices.MODERATION, VacancyStatusChoices.CLOSED, VacancyStatusChoices.CANCELED
-        )
-        )
-
-        units = Unit.objects.prefetch_related(
-            'vacancies', 'vacancies__position', 'vacancies__offices__city',
-        ).departments().filter(q).exclude(code=user_department_code).distinct()
+            units = units.filter(children__vacancies__offices__city__id=city_id).distinct()
 
+        unit_counters = Vacancy.get_published_counters()['units']
         units_to_return = []
 
         for unit in units:
-            total_vacancies = unit.get_num_vacancies_from_descendants()
+            counter = unit_counters.get(unit.id, {})
+            # Департамент без опубликованных вакансий выбранного типа карьеры не отдаем
+            if career and not counter.get(career):
+                continue
+            total_vacancies = counter.get('total', 0)
             if total_vacancies > 0:
                 unit.total_vacancies = total_vacancies
                 units_to_return.append(unit)
@@ -0,0 +1,141 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional, Tuple
+
+import httpx
+from django.conf import settings
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEE_REQUEST_LATENCY = Histogram(
+    'employee_request_duration_seconds', 'Время ответа employee', ['endpoint'],
+)
+EMPLOYEE_REQUEST_ERRORS = Counter(
+    'employee_request_errors_total', 'Ошибки запросов в employee', ['endpoint', 'reason'],
+)
+
+
+class EmployeeClient:
+    """Клиент сервиса employee.
+    Держит пул соединений (keep-alive), повторяет запрос с экспоненциальной задержкой при 5xx и сетевых ошибках.
+    Запросы в рамках запроса пользователя (in_request) - с коротким таймаутом и меньшим числом повторов.
+    После EMPLOYEE_CIRCUIT_FAILURE_THRESHOLD неудачных запросов подряд перестает ходить в employee
+    на EMPLOYEE_CIRCUIT_RESET_TIMEOUT секунд (circuit breaker) и сразу возвращает None.
+    """
+
+    def __init__(self):
+        self.base_url = settings.EMPLOYEE_BASE_API_URL
+        self.http_client = httpx.Client(
+            auth=(settings.EMPLOYEE_TECH_USER, settings.EMPLOYEE_TECH_PASSWORD),
+            timeout=httpx.Timeout(settings.EMPLOYEE_TIMEOUT, connect=5.0, pool=settings.EMPLOYEE_POOL_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.EMPLOYEE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EMPLOYEE_MAX_CONNECTIONS,
+            ),
+            verify=False,
+        )
+        self.request_timeout = httpx.Timeout(
+            settings.EMPLOYEE_REQUEST_TIMEOUT,
+            connect=min(5.0, settings.EMPLOYEE_REQUEST_TIMEOUT),
+            pool=min(settings.EMPLOYEE_POOL_TIMEOUT, settings.EMPLOYEE_REQUEST_TIMEOUT),
+        )
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> Tuple[bool, bool]:
+        """Цепь замкнута - запросы идут. Цепь разомкнута - employee недоступен, запросы не отправляем.
+        По истечении EMPLOYEE_CIRCUIT_RESET_TIMEOUT пропускается один пробный запрос (half-open),
+        остальные получают отказ до его результата или до следующего EMPLOYEE_CIRCUIT_RESET_TIMEOUT.
+        Возвращает (можно ли отправить запрос, пробный ли это запрос).
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True, False
+            if time.monotonic() - self.opened_at < settings.EMPLOYEE_CIRCUIT_RESET_TIMEOUT:
+                return False, False
+            # Окно отказа начинается заново: пока идет пробный запрос, остальные не пропускаем
+            self.opened_at = time.monotonic()
+            return True, True
+
+    def on_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= settings.EMPLOYEE_CIRCUIT_FAILURE_THRESHOLD:
+                if self.opened_at is None:
+                    logger.error('Employee недоступен, запросы приостановлены')
+                self.opened_at = time.monotonic()
+
+    def get(self, url: str, params: Optional[dict] = None, in_request: bool = False) -> Optional[dict]:
+        """:param in_request: запрос в рамках запроса пользователя - короткий таймаут и EMPLOYEE_REQUEST_RETRIES"""
+        allowed, probe = self.allow_request()
+        if not allowed:
+            EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason='circuit_open').inc()
+            return None
+        full_url = f'{self.base_url}/{url}'
+        timeout = self.request_timeout if in_request else httpx.USE_CLIENT_DEFAULT
+        # Пробный запрос не повторяем
+        retries = 0 if probe else settings.EMPLOYEE_REQUEST_RETRIES if in_request else settings.EMPLOYEE_RETRIES
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(settings.EMPLOYEE_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(1, 1.5))
+            start = time.monotonic()
+            try:
+                response = self.http_client.get(url=full_url, params=params, timeout=timeout)
+            except httpx.TimeoutException:
+                EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason='timeout').inc()
+                logger.warning(f'Timeout with sending request to {full_url}')
+                continue
+            except httpx.HTTPError:
+                EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason='connection').inc()
+                logger.warning(f'Error with sending request to {full_url}')
+                continue
+            EMPLOYEE_REQUEST_LATENCY.labels(endpoint=url).observe(time.monotonic() - start)
+            if response.status_code >= 500:
+                EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason=response.status_code).inc()
+                logger.warning(f'Request to {full_url} failed with status: {response.status_code}')
+                continue
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                except ValueError:
+                    # Например, страница ошибки прокси - считаем отказом, как 5xx
+                    EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason='invalid_json').inc()
+                    logger.warning(f'Request to {full_url} returned invalid JSON')
+                    continue
+                self.on_success()
+                return data
+            self.on_success()
+            EMPLOYEE_REQUEST_ERRORS.labels(endpoint=url, reason=response.status_code).inc()
+            logger.error(f'Request to {full_url} failed with status: {response.status_code}')
+            return None
+        logger.error(f'Error with sending request to {full_url}')
+        self.on_failure()
+        return None
+
+
+_employee_client = None
+_employee_client_pid = None
+_employee_client_lock = threading.Lock()
+
+
+def get_employee_client() -> EmployeeClient:
+    """Клиент employee, общий для процесса.
+    Пересоздается после fork (воркеры celery/gunicorn), чтобы не делить сокеты с родительским процессом.
+    """
+    global _employee_client, _employee_client_pid
+    if _employee_client_pid != os.getpid():
+        with _employee_client_lock:
+            if _employee_client_pid != os.getpid():
+                _employee_client = EmployeeClient()
+                _employee_client_pid = os.getpid()
+    return _employee_client
@@ -0,0 +1,8 @@
+from app.celery import celery
+from core.utils import refresh_employee_cache
+
+
+@celery.task
+def refresh_employee_data(url: str, params: dict):
+    """Фоновое обновление закэшированного ответа employee."""
+    refresh_employee_cache(url, params, keep_stale=True)
@@ -1,35 +1,103 @@
-import json
 import logging
 import random
-from typing import Union
+import time
+import uuid
+from typing import Iterable, Optional, Tuple, Union
+from urllib.parse import urlencode
 
-import httpx
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import QuerySet
 from django.utils import timezone
-from httpx import HTTPError, Timeout
+
+from core.clients import get_employee_client
 
 logger = logging.getLogger(__name__)
 
 
-def get_employee_data(url: str, params={}) -> Union[dict, None]:
-    url = f'{settings.EMPLOYEE_BASE_API_URL}/{url}'
-    timeout = Timeout(120.0, connect=5.0)
-    try:
-        response = httpx.get(
-            url=url,
-            params=params,
-            auth=(settings.EMPLOYEE_TECH_USER, settings.EMPLOYEE_TECH_PASSWORD),
-            timeout=timeout,
-            verify=False
-        )
-        if response.status_code == 200:
-            return json.loads(response.content)
-        else:
-            logger.error(f"Request to {url} failed with status: {response.status_code}")
-    except HTTPError:
-        logger.error(f'Error with sending request to {url}')
-    return None
+def get_employee_cache_key(url: str, params: dict) -> str:
+    return f'employee_data:{url}:{urlencode(sorted(params.items()))}'
+
+
+def refresh_employee_cache(
+        url: str, params={}, keep_stale: bool = False, in_request: bool = False
+) -> Union[dict, None]:
+    """Запрашивает данные из employee и сохраняет их в кэш.
+    Пустой ответ кэшируется на EMPLOYEE_CACHE_NEGATIVE_TIMEOUT (negative cache).
+    :param keep_stale: не затирать имеющиеся в кэше данные пустым ответом (при фоновом обновлении)
+    :param in_request: запрос в рамках запроса пользователя (см. EmployeeClient.get)
+    """
+    key = get_employee_cache_key(url, params)
+    data = get_employee_client().get(url, params, in_request=in_request)
+    if data is None:
+        if keep_stale and cache.get(key, {}).get('data') is not None:
+            cache.delete(f'{key}:refresh')
+            return None
+        timeout = settings.EMPLOYEE_CACHE_NEGATIVE_TIMEOUT
+        stale_timeout = 0
+    else:
+        timeout = settings.EMPLOYEE_CACHE_TIMEOUTS.get(url, settings.EMPLOYEE_CACHE_DEFAULT_TIMEOUT)
+        stale_timeout = settings.EMPLOYEE_CACHE_STALE_TIMEOUT
+    cache.set(key, {'data': data, 'expires_at': time.time() + timeout}, timeout=timeout + stale_timeout)
+    cache.delete(f'{key}:refresh')
+    return data
+
+
+def get_cached_employee_data(url: str, params={}) -> Union[dict, None]:
+    """Возвращает данные employee через кэш.
+    Устаревшие данные отдаются из кэша, а обновление запускается в фоне (stale-while-revalidate).
+    В employee идем синхронно только если данных в кэше нет совсем.
+    """
+    key = get_employee_cache_key(url, params)
+    entry = cache.get(key)
+    if entry is None:
+        return refresh_employee_cache(url, params, in_request=True)
+    if entry['expires_at'] < time.time() and cache.add(
+            f'{key}:refresh', True, timeout=settings.EMPLOYEE_CACHE_REFRESH_LOCK_TIMEOUT
+    ):
+        from core.tasks import refresh_employee_data
+        refresh_employee_data.delay(url, params)
+    return entry['data']
+
+
+def invalidate_employee_cache(lookups: Iterable[Tuple[str, dict]]):
+    """Удаляет из кэша ответы employee. lookups - пары (url, params)."""
+    cache.delete_many([get_employee_cache_key(url, params) for url, params in lookups])
+
+
+def get_cache_version(key: str) -> str:
+    """Возвращает текущую версию группы закэшированных данных.
+    Версия входит в ключи кэша, поэтому ее смена разом инвалидирует всю группу.
+    """
+    return cache.get_or_set(key, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def bump_cache_version(key: str):
+    cache.set(key, uuid.uuid4().hex, timeout=None)
+
+
+def get_daily_seed(name: str) -> str:
+    """Seed для get_random_sample, одинаковый в течение дня: выборка за день не меняется и ее можно кэшировать."""
+    return f'{name}:{timezone.now().date().isoformat()}'
+
+
+def get_random_sample(queryset: QuerySet, size: int, seed: Optional[str] = None,
+                      ids_cache_key: Optional[str] = None) -> list:
+    """Случайная выборка size объектов из queryset без ORDER BY RANDOM() (сортировки всей таблицы).
+    Случайные id выбираются из списка id queryset, затем загружаются только выбранные объекты.
+    Список id можно хранить в кэше (ids_cache_key) на RANDOM_SAMPLE_IDS_TIMEOUT, тогда сбрасывать его
+    при изменении данных должен вызывающий код.
+    :param seed: при одинаковом seed и списке id выборка одинаковая (см. get_daily_seed)
+    """
+    ids = cache.get(ids_cache_key) if ids_cache_key else None
+    if ids is None:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        if ids_cache_key:
+            cache.set(ids_cache_key, ids, timeout=settings.RANDOM_SAMPLE_IDS_TIMEOUT)
+    sample_ids = random.Random(seed).sample(ids, min(size, len(ids)))
+    objects = queryset.in_bulk(sample_ids)
+    return [objects[pk] for pk in sample_ids if pk in objects]
 
 
 def file_path(instance, filename):
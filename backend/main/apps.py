@@ -5,3 +5,6 @@ class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
     verbose_name = 'Главная страница'
+
+    def ready(self):
+        import main.signals  # noqa: F401
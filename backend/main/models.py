@@ -4,16 +4,18 @@ from collections import defaultdict
 
 from django.conf import settings
 from django.core import validators
-from django.db import models
-from django.db.models import Count
+from django.core.cache import cache
+from django.db import models, transaction
 
 from app.models import TimestampedModel
 from app.utils import prepare_and_send_templated_email
 from core.enums import CareerTypeChoices
-from core.models import BaseCard, CareerType
-from core.utils import file_path
+from core.models import BaseCard
+from core.utils import bump_cache_version, file_path, get_cache_version
 from main.enums import CareerTypeCardChoices
 
+POLL_RESULT_LOOKUP_VERSION_KEY = 'poll_result_lookup_version'
+
 
 class CareerTypeCard(BaseCard):
     image = models.ImageField(
@@ -192,20 +194,56 @@ class PollResult(models.Model):
         verbose_name = "Результат теста"
         verbose_name_plural = "Результаты теста"
 
+    # Таблица результатов в памяти процесса: (версия, таблица), см. get_lookup
+    _lookup: tuple[str, dict] | None = None
+
+    @staticmethod
+    def build_lookup() -> dict:
+        """Таблица для подсчета результата теста:
+        questions - {id вопроса: тип карьеры}, results - {frozenset типов карьеры: результат}.
+        Результат без типов карьеры лежит под пустым frozenset. Если на набор типов несколько результатов,
+        берется последний по id (как .last() в запросе).
+        """
+        results = {}
+        for poll_result in PollResult.objects.prefetch_related('career_types').order_by('id'):
+            results[frozenset(career_type.slug for career_type in poll_result.career_types.all())] = poll_result
+        return {
+            'questions': dict(Question.objects.values_list('id', 'career_type_id')),
+            'results': results,
+        }
+
     @classmethod
-    def calculate_results(cls, answers: list[dict]) -> PollResult:
+    def get_lookup(cls) -> dict:
+        """Таблица результатов из памяти процесса, при смене версии - из кэша или из базы.
+        Версия меняется при изменении вопросов и результатов теста (см. main.signals).
+        """
+        version = get_cache_version(POLL_RESULT_LOOKUP_VERSION_KEY)
+        if cls._lookup is None or cls._lookup[0] != version:
+            key = f'poll_result_lookup:{version}'
+            lookup = cache.get(key)
+            if lookup is None:
+                lookup = cls.build_lookup()
+                cache.set(key, lookup, timeout=settings.POLL_RESULT_LOOKUP_TIMEOUT)
+            cls._lookup = (version, lookup)
+        return cls._lookup[1]
+
+    @staticmethod
+    def invalidate_lookup():
+        transaction.on_commit(lambda: bump_cache_version(POLL_RESULT_LOOKUP_VERSION_KEY))
+
+    @classmethod
+    def calculate_results(cls, answers: list[dict]) -> PollResult | None:
+        lookup = cls.get_lookup()
 
         # Формируем словарь с карьерными типами
         count_career_type = {
             career_type: 0 for career_type, _ in CareerTypeChoices.choices
         }
-        # Забираем только те вопросы, на которые ответили "Да"
-        questions = Question.objects.select_related("career_type").filter(
-            id__in=[answer["question_id"] for answer in answers if answer["answer"]]
-        )
-        # Считаем количество выбранных карьерных типов
-        for question in questions:
-            count_career_type[question.career_type.slug] += 1
+        # Считаем количество выбранных карьерных типов по вопросам, на которые ответили "Да", повторы не учитываются
+        for question_id in {answer['question_id'] for answer in answers if answer['answer']}:
+            career_type = lookup['questions'].get(question_id)
+            if career_type:
+                count_career_type[career_type] += 1
         # Формируем словарь, в котором ключи - количество выбранных карьерных типов, а значения - сет из набора
         # соответствующих типов. Необходимо для того, чтобы определить максимально значимые карьерные типы
         final_count_career_type = defaultdict(set)
@@ -214,24 +252,9 @@ class PollResult(models.Model):
 
         max_counts = max(final_count_career_type.keys())
 
-        if max_counts == 0:
-            return PollResult.objects.filter(career_types__isnull=True).last()
-
-        career_types = list(final_count_career_type[max_counts])
-
-        # https://groups.google.com/g/django-users/c/X9TCSrBn57Y
-        # Ищем такие результаты, которые будут соответствовать выбранным карьерным типам
-        poll_result = PollResult.objects.filter(
-            career_types__in=career_types
-        ).annotate(
-            num_types=Count('career_types')
-        ).filter(
-            num_types=len(career_types)
-        ).exclude(
-            career_types__in=CareerType.objects.exclude(
-                slug__in=career_types)
-        ).last()
-        return poll_result
+        # Результат, типы карьеры которого совпадают с выбранными, при max_counts == 0 - результат без типов
+        career_types = final_count_career_type[max_counts] if max_counts else set()
+        return lookup['results'].get(frozenset(career_types))
 
 
 class PollResultToCareerType(models.Model):
@@ -57,8 +57,11 @@ class BannerSerializer(serializers.ModelSerializer):
         fields = ('title', 'text', 'images')
 
     def get_images(self, instance):
-        not_empty_banner_images = instance.banner_images.exclude(user__image_url__isnull=True)
-        return [banner_image.user.image_url for banner_image in not_empty_banner_images]
+        # banner_images с пользователями загружены через prefetch_related (см. main.utils.build_main_page)
+        return [
+            banner_image.user.image_url for banner_image in instance.banner_images.all()
+            if banner_image.user.image_url is not None
+        ]
 
 
 class QuestionSerializer(serializers.ModelSerializer):
@@ -81,14 +84,6 @@ class PollSerializer(serializers.ModelSerializer):
         return instance.text.replace('\\n', '\n')
 
 
-class MainSerializer(serializers.Serializer):
-    career_type_cards = CareerTypeCardSerializer(many=True)
-    interesting_cards = InterestingCardSerializer(many=True)
-    employee_cards = EmployeeCardSerializer(many=True)
-    banner = BannerSerializer()
-    poll = PollSerializer()
-
-
 class CareerTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = CareerType
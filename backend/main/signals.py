@@ -0,0 +1,38 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import CareerType
+from main.models import (
+    Banner,
+    BannerImage,
+    CareerTypeCard,
+    EmployeeCard,
+    InterestingCard,
+    Poll,
+    PollResult,
+    PollResultToCareerType,
+    Question
+)
+from main.utils import invalidate_main_page
+
+
+@receiver([post_save, post_delete], sender=CareerTypeCard)
+@receiver([post_save, post_delete], sender=InterestingCard)
+@receiver([post_save, post_delete], sender=EmployeeCard)
+@receiver([post_save, post_delete], sender=Banner)
+@receiver([post_save, post_delete], sender=BannerImage)
+@receiver([post_save, post_delete], sender=Poll)
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_main_page_cache(sender, **kwargs):
+    """Сбрасывает закэшированные данные главной страницы."""
+    invalidate_main_page()
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=PollResult)
+@receiver([post_save, post_delete], sender=PollResultToCareerType)
+@receiver(m2m_changed, sender=PollResult.career_types.through)
+@receiver([post_save, post_delete], sender=CareerType)
+def invalidate_poll_result_lookup(sender, **kwargs):
+    """Сбрасывает таблицу результатов теста."""
+    PollResult.invalidate_lookup()
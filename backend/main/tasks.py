@@ -4,7 +4,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 
 from app.celery import celery
+from core.utils import get_random_sample
 from main.models import Banner, BannerImage
+from main.utils import invalidate_main_page
 
 UserModel = get_user_model()
 logger = logging.getLogger(__name__)
@@ -17,11 +19,13 @@ def update_images_for_banner():
     """
     banner = Banner.objects.last()
 
-    new_banner_users = UserModel.objects.filter(
-        image_url__isnull=False
-    ).order_by('?')[:settings.NUM_OF_BANNER_IMAGES]
+    new_banner_users = get_random_sample(
+        UserModel.objects.filter(image_url__isnull=False), settings.NUM_OF_BANNER_IMAGES
+    )
 
     BannerImage.objects.filter(banner=banner).delete()
     BannerImage.objects.bulk_create([
         BannerImage(banner=banner, user=user) for user in new_banner_users
     ])
+    # bulk_create не отправляет сигналы
+    invalidate_main_page()
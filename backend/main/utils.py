@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from core.utils import bump_cache_version, get_cache_version
+from main.models import (
+    Banner,
+    BannerImage,
+    CareerTypeCard,
+    EmployeeCard,
+    InterestingCard,
+    Poll
+)
+from main.serializers import (
+    BannerSerializer,
+    CareerTypeCardSerializer,
+    EmployeeCardSerializer,
+    InterestingCardSerializer,
+    PollSerializer
+)
+
+MAIN_PAGE_VERSION_KEY = 'main_page_version'
+MAIN_PAGE_CACHE_KEY = 'main_page'
+
+
+def build_main_page() -> dict:
+    return {
+        'career_type_cards': CareerTypeCardSerializer(
+            CareerTypeCard.objects.order_by('priority'),
+            many=True
+        ).data,
+        'interesting_cards': InterestingCardSerializer(
+            InterestingCard.objects.order_by('priority'),
+            many=True
+        ).data,
+        'employee_cards': EmployeeCardSerializer(
+            EmployeeCard.objects.select_related('user').order_by('-modified'),
+            many=True
+        ).data,
+        'banner': BannerSerializer(
+            Banner.objects.prefetch_related(
+                Prefetch('banner_images', queryset=BannerImage.objects.select_related('user'))
+            ).last()
+        ).data,
+        'poll': PollSerializer(
+            Poll.objects.prefetch_related('questions').last(),
+        ).data
+    }
+
+
+def get_main_page() -> dict:
+    """Данные главной страницы через кэш.
+    Версия и данные читаются из кэша одним запросом. Данные пересобираются, если сменилась версия
+    (изменились карточки, баннер или тест, см. main.signals) или наступил новый день - от даты зависит is_new
+    в карточках "Карьера и кофе". Время хранения - не больше MAIN_PAGE_CACHE_TIMEOUT и не дольше конца дня.
+    """
+    now = timezone.now()
+    today = now.date().isoformat()
+    cached = cache.get_many([MAIN_PAGE_VERSION_KEY, MAIN_PAGE_CACHE_KEY])
+    version = cached.get(MAIN_PAGE_VERSION_KEY)
+    page = cached.get(MAIN_PAGE_CACHE_KEY)
+    if version and page and page['version'] == version and page['date'] == today:
+        return page['data']
+
+    version = version or get_cache_version(MAIN_PAGE_VERSION_KEY)
+    data = build_main_page()
+    end_of_day = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    timeout = min(settings.MAIN_PAGE_CACHE_TIMEOUT, int((end_of_day - now).total_seconds()) + 1)
+    cache.set(MAIN_PAGE_CACHE_KEY, {'version': version, 'date': today, 'data': data}, timeout=timeout)
+    return data
+
+
+def invalidate_main_page():
+    # Сбрасываем после коммита, чтобы страница не собралась по незакоммиченным данным
+    transaction.on_commit(lambda: bump_cache_version(MAIN_PAGE_VERSION_KEY))
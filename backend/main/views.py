@@ -1,52 +1,19 @@
 from rest_framework import generics
 from rest_framework.response import Response
 
-from .models import (
-    Banner,
-    CareerTypeCard,
-    EmployeeCard,
-    InterestingCard,
-    Poll,
-    PollResult
-)
+from .models import PollResult
 from .serializers import (
-    BannerSerializer,
-    CareerTypeCardSerializer,
-    EmployeeCardSerializer,
-    InterestingCardSerializer,
     InvitationSerializer,
-    MainSerializer,
     PollAnswerWrapperSerializer,
-    PollResultSerializer,
-    PollSerializer
+    PollResultSerializer
 )
+from .utils import get_main_page
 
 
 class MainView(generics.GenericAPIView):
 
     def get(self, request):
-        serialized_data = MainSerializer(data={
-            'career_type_cards': CareerTypeCardSerializer(
-                CareerTypeCard.objects.order_by('priority'),
-                many=True
-            ).data,
-            'interesting_cards': InterestingCardSerializer(
-                InterestingCard.objects.order_by('priority'),
-                many=True
-            ).data,
-            'employee_cards': EmployeeCardSerializer(
-                EmployeeCard.objects.select_related('user').order_by('-modified'),
-                many=True
-            ).data,
-            'banner': BannerSerializer(
-                Banner.objects.last()
-            ).data,
-            'poll': PollSerializer(
-                Poll.objects.prefetch_related('questions').last(),
-            ).data
-        })
-        serialized_data.is_valid()
-        return Response(serialized_data.data)
+        return Response(get_main_page())
 
 
 class PollView(generics.GenericAPIView):
@@ -5,3 +5,6 @@ class ApplicationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'replies'
     verbose_name = 'Заявки'
+
+    def ready(self):
+        import replies.signals  # noqa: F401
@@ -1,11 +1,14 @@
 import logging
+from datetime import date
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Func, Value
+from django.db.models.functions import Mod, TruncDate
 from django.utils import timezone
 
 from app.models import TimestampedModel
-from app.utils import prepare_and_send_templated_email
+from app.utils import prepare_and_send_templated_emails, send_deferred_templated_email
 from core.utils import file_path
 from replies.enums import (
     ExperienceChoices,
@@ -68,6 +71,12 @@ class Reply(TimestampedModel):
                 step.activate()
         return True, 'Маршрут создан'
 
+    @staticmethod
+    def get_email_context(pk: int) -> dict:
+        """Контекст писем отклика одним запросом, используется при рендеринге писем в воркере."""
+        reply = Reply.objects.select_related('user', 'vacancy').get(id=pk)
+        return {'user': reply.user, 'vacancy': reply.vacancy, 'inbox_link': settings.INBOX_LINK}
+
     @property
     def route(self):  # на основе этого буду генерировать маршрут для заявки, и выполнять действия при переходе
         return {
@@ -142,17 +151,34 @@ class Reply(TimestampedModel):
 
 class StepManager(models.Manager):
 
-    def interview_notify_new_boss(self):
-        steps_need_notify = Step.objects.select_related(
-            'reply', 'user'
-        ).filter(
+    def interview_notify_due(self, today: date = None):
+        """Активные шаги собеседования, по которым в день today (по умолчанию сегодня) напоминаем руководителю
+        (раз в REMINDER_INTERVAL дней)."""
+        days_active = Func(
+            Value(today or timezone.now().date()), TruncDate('activation_date', tzinfo=timezone.utc),
+            template='(%(expressions)s)', arg_joiner=' - ', output_field=models.IntegerField()
+        )
+        return self.filter(
             state=StepStateChoices.ACTIVE,
             role=StepRoleChoices.NEW_BOSS,
             title=TitleStateChoices.INTERVIEW
+        ).annotate(
+            days_active=days_active
+        ).annotate(
+            days_mod=Mod('days_active', settings.REMINDER_INTERVAL)
+        ).filter(days_mod=0)
+
+    def interview_notify_new_boss(self, id_from: int, id_to: int, today: date = None):
+        """Напоминания по шагам с id из [id_from, id_to), письма ставятся в очередь одним запросом."""
+        steps_need_notify = self.interview_notify_due(today).filter(
+            id__gte=id_from, id__lt=id_to
+        ).select_related(
+            'user', 'reply__user', 'reply__vacancy__manager', 'reply__vacancy__recruiter'
         )
-        for step in steps_need_notify:
-            if (timezone.now().date() - step.activation_date.date()).days % settings.REMINDER_INTERVAL == 0:
-                step.email_interview_for_manager(first=False)
+        prepare_and_send_templated_emails([
+            (step.interview_recipients, 'email/replies/interview_for_manager', 'Запланируй собеседование', step.context)
+            for step in steps_need_notify
+        ])
 
 
 class Step(models.Model):
@@ -201,11 +227,21 @@ class Step(models.Model):
             'hr_vacancies_link': settings.HR_VACANCIES_LINK,
         }
 
+    @staticmethod
+    def get_email_context(pk: int) -> dict:
+        """Контекст писем шага одним запросом, используется при рендеринге писем в воркере."""
+        step = Step.objects.select_related(
+            'user', 'reply__user', 'reply__vacancy__manager'
+        ).get(id=pk)
+        return step.context
+
     def activate(self):
         self.state = self.reply.route[self.index]['activate_state']
         self.status = self.reply.status
         self.activation_date = timezone.now()
         self.save()
+        # Получатели писем из уже загруженного отклика, контекст писем собирается в воркере
+        reply = self.reply
         if self.title == TitleStateChoices.AGREEMENT:
             template_for_current_boss = 'email/replies/new_reply_for_current_boss'
             subject_for_current_boss = 'Ваш сотрудник откликнулся на вакансию'
@@ -214,67 +250,75 @@ class Step(models.Model):
             template_for_recruiter = 'email/replies/new_reply_for_recruiter'
 
             # Отправляем письмо текущему руководителю
-            if self.reply.user.manager:
-                prepare_and_send_templated_email(
-                    recipients=[self.reply.user.manager.email],
+            if reply.user.manager:
+                send_deferred_templated_email(
+                    recipients=[reply.user.manager.email],
                     template=template_for_current_boss,
                     subject=subject_for_current_boss,
-                    context=self.context
+                    model_label='replies.Step',
+                    pk=self.id
                 )
 
-            vacancy_manager = self.reply.vacancy.manager
+            vacancy_manager = reply.vacancy.manager
             vacancy_manager_email = vacancy_manager.email if vacancy_manager else None
             if vacancy_manager_email:
                 # Отправляем письмо будущему руководителю
-                prepare_and_send_templated_email(
+                send_deferred_templated_email(
                     recipients=[vacancy_manager_email],
                     template=template_for_new_boss,
                     subject=subject_for_new_boss,
-                    context=self.context
+                    model_label='replies.Step',
+                    pk=self.id
                 )
 
-            vacancy_recruiter = self.reply.vacancy.recruiter
+            vacancy_recruiter = reply.vacancy.recruiter
             vacancy_recruiter_email = vacancy_recruiter.email if vacancy_recruiter else None
             if vacancy_recruiter_email:
                 # Отправляем письмо рекрутеру
-                prepare_and_send_templated_email(
+                send_deferred_templated_email(
                     recipients=[vacancy_recruiter_email],
                     template=template_for_recruiter,
                     subject=subject_for_recruiter,
-                    context=self.context
+                    model_label='replies.Step',
+                    pk=self.id
                 )
 
         if self.title == TitleStateChoices.INTERVIEW:
             self.email_interview_for_manager()  # Напоминание менеджеру и рекрутеру запланировать собеседование
             # Сообщение сотруднику, что его позвали на собеседование.
-            prepare_and_send_templated_email(
-                [self.reply.user.email],
+            send_deferred_templated_email(
+                [reply.user.email],
                 'email/replies/invite_interview',
                 'Приглашение на собеседование',
-                self.context
+                'replies.Step',
+                self.id
             )
         if self.title == TitleStateChoices.HIRED:
-            prepare_and_send_templated_email(  # Уведомление сотруднику
-                [self.reply.user.email],
+            send_deferred_templated_email(  # Уведомление сотруднику
+                [reply.user.email],
                 'email/replies/hired_user',
                 'Твоя заявка согласована',
-                self.context
+                'replies.Step',
+                self.id
             )
-            if self.reply.vacancy.manager:
-                prepare_and_send_templated_email(  # Уведомление будущему руководителю
-                    [self.reply.vacancy.manager.email],
+            if reply.vacancy.manager:
+                send_deferred_templated_email(  # Уведомление будущему руководителю
+                    [reply.vacancy.manager.email],
                     'email/replies/hired_for_new_boss',
                     'Запусти процесс перевода сотрудника',
-                    self.context
+                    'replies.Step',
+                    self.id
                 )
             # Уведомление рекрутеру и администраторам
-            prepare_and_send_templated_email(  # Уведомление рекрутеру и администраторам
-                [self.reply.vacancy.recruiter.email if self.reply.vacancy.recruiter else None, settings.EMAIL_ADMIN],
+            send_deferred_templated_email(  # Уведомление рекрутеру и администраторам
+                [reply.vacancy.recruiter.email if reply.vacancy.recruiter else None, settings.EMAIL_ADMIN],
                 'email/replies/hired_for_recruiter_and_admins',
                 'Кандидат на вакансию согласован',
-                self.context
+                'replies.Step',
+                self.id
             )
 
+    @transaction.atomic
     def end_activity(self, resolution=None, comment=None, step=None, reply_status=None, step_status=None, state=None):
         if resolution:
             self.resolution = resolution
@@ -285,19 +329,19 @@ class Step(models.Model):
             self.reply.status = reply_status
             self.reply.save()
 
-            from sap.tasks import (
-                update_reply_interview_status_in_sap,
-                update_reply_resume_status_in_sap,
-            )
+            from sap.enum import SapOutboxMessageType
+            from sap.models import SapOutbox
 
             if self.index == 1:
-                update_reply_resume_status_in_sap.delay(self.reply_id)
+                SapOutbox.enqueue(SapOutboxMessageType.RESUME_STATUS, self.reply_id, vacancy_id=self.reply.vacancy_id)
 
                 if reply_status == ReplyStatusChoices.HIRED:
-                    update_reply_interview_status_in_sap.delay(self.reply_id)
+                    SapOutbox.enqueue(
+                        SapOutboxMessageType.INTERVIEW_STATUS, self.reply_id, vacancy_id=self.reply.vacancy_id
+                    )
 
             elif self.index == 2:
-                update_reply_interview_status_in_sap.delay(self.reply_id)
+                SapOutbox.enqueue(SapOutboxMessageType.INTERVIEW_STATUS, self.reply_id, vacancy_id=self.reply.vacancy_id)
 
         if step_status:
             self.status = step_status
@@ -313,6 +357,7 @@ class Step(models.Model):
     def next(self, steps_number):
         next_step = Step.objects.filter(reply=self.reply, index=(self.index + steps_number)).first()
         if next_step:
+            next_step.reply = self.reply
             next_step.activate()
         missed_steps = Step.objects.filter(
             reply=self.reply,
@@ -332,28 +377,30 @@ class Step(models.Model):
         ).update(
             state=StepStateChoices.STOP
         )
-        prepare_and_send_templated_email(
+        send_deferred_templated_email(
             [self.reply.user.email],
             'email/replies/reject_user',
             'Заявка отклонена',
-            self.context
+            'replies.Step',
+            self.id
         )
 
-    def email_interview_for_manager(self, first=True):
-        if first:
-            template = 'email/replies/interview_for_manager_first'
-        else:
-            template = 'email/replies/interview_for_manager'
+    @property
+    def interview_recipients(self):
         recipients = []
         if self.reply.vacancy.manager:
             recipients.append(self.reply.vacancy.manager.email)
         if self.reply.vacancy.recruiter:
             recipients.append(self.reply.vacancy.recruiter.email)
-        prepare_and_send_templated_email(
-            recipients,
-            template,
+        return recipients
+
+    def email_interview_for_manager(self):
+        send_deferred_templated_email(
+            self.interview_recipients,
+            'email/replies/interview_for_manager_first',
             'Запланируй собеседование',
-            self.context
+            'replies.Step',
+            self.id
         )
 
 
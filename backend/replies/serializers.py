@@ -1,11 +1,12 @@
 import logging
 
 from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 import app.errors as errors
-from app.utils import prepare_and_send_templated_email
+from app.utils import send_deferred_templated_email
 from company.enums import SelectionTypeChoices
 from replies.enums import (
     ExperienceChoices,
@@ -20,11 +21,8 @@ from replies.tasks import (
     send_email_about_new_vacancy_reserve_reply,
     send_emails_about_new_test_drive_reply
 )
-from sap.tasks import (
-    send_candidate_to_sap,
-    update_reply_interview_status_in_sap,
-    update_reply_resume_status_in_sap
-)
+from sap.enum import SapOutboxMessageType
+from sap.models import SapOutbox
 from users.serializers import UserReplyAvatarSerializer
 from vacancies.enums import QuestionType, VacancyStatusChoices
 from vacancies.models import Question, Restrict, UserAnswer, Vacancy, VacancyReserve
@@ -211,28 +209,25 @@ class ReplyOutboxUpdateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         current_step = instance.steps.filter(state=StepStateChoices.ACTIVE).first()
         if current_step and current_step.user != instance.user:
-            context = {
-                'user': instance.user,
-                'vacancy': instance.vacancy,
-                'inbox_link': settings.INBOX_LINK
-            }
-            prepare_and_send_templated_email(
+            send_deferred_templated_email(
                 [current_step.user.email, instance.vacancy.recruiter.email if instance.vacancy.recruiter else None],
-                context=context,
                 template='email/replies/cancel_reply',
-                subject='Карьерные маршруты - Отклик на вакансию отозван.'
+                subject='Карьерные маршруты - Отклик на вакансию отозван.',
+                model_label='replies.Reply',
+                pk=instance.id
             )
             current_step.state = StepStateChoices.END
             current_step.status = ReplyStatusChoices.CANCELED
             current_step.save()
         # Активный шаг завершаем и проставляем ему статус "отозвана"
         # Все шаги до которых процесс еще не дошел переводим в состояние "STOP"
-        instance.steps.filter(state=StepStateChoices.EXPECTED).update(state=StepStateChoices.STOP)
-        instance.status = ReplyStatusChoices.CANCELED
-        instance.save()
+        with transaction.atomic():
+            instance.steps.filter(state=StepStateChoices.EXPECTED).update(state=StepStateChoices.STOP)
+            instance.status = ReplyStatusChoices.CANCELED
+            instance.save()
 
-        update_reply_resume_status_in_sap.delay(instance.id)
-        update_reply_interview_status_in_sap.delay(instance.id)
+            SapOutbox.enqueue(SapOutboxMessageType.RESUME_STATUS, instance.id, vacancy_id=instance.vacancy_id)
+            SapOutbox.enqueue(SapOutboxMessageType.INTERVIEW_STATUS, instance.id, vacancy_id=instance.vacancy_id)
 
         # Если вакансия была в статусе "Принят" и больше нет откликов в статусе "Принят",
         # возвращаем вакансию в статус "Опубликована"
@@ -318,9 +313,10 @@ class VacancyReplyCreateSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         vacancy = validated_data['vacancy']
         if not settings.VACANCY_REPLY_TEST_ENABLED:
-            instance = Reply.objects.create(user=user, status=ReplyStatusChoices.PENDING, **validated_data)
-            send_candidate_to_sap.delay(instance.id)
-            instance.create_steps()
+            with transaction.atomic():
+                instance = Reply.objects.create(user=user, status=ReplyStatusChoices.PENDING, **validated_data)
+                SapOutbox.enqueue(SapOutboxMessageType.FEEDBACK, instance.id, vacancy_id=instance.vacancy_id)
+                instance.create_steps()
             return instance
         test = validated_data.pop('user').get('user_answer')
         poll = vacancy.polls.order_by('id').last()
@@ -361,9 +357,10 @@ class VacancyReplyCreateSerializer(serializers.ModelSerializer):
             Restrict.objects.create(vacancy=validated_data['vacancy'], user=user)
             raise ValueError(errors.FAILED_TEST)
         validated_data.update({'user': user, 'status': ReplyStatusChoices.PENDING, 'poll': poll})
-        instance = self.Meta.model.objects.create(**validated_data)
-        send_candidate_to_sap.delay(instance.id)
-        instance.create_steps()
+        with transaction.atomic():
+            instance = self.Meta.model.objects.create(**validated_data)
+            SapOutbox.enqueue(SapOutboxMessageType.FEEDBACK, instance.id, vacancy_id=instance.vacancy_id)
+            instance.create_steps()
         return instance
 
 
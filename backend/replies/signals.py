@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app.pagination import invalidate_pagination_counts
+from replies.models import Reply, Step
+
+
+@receiver([post_save, post_delete], sender=Reply)
+@receiver([post_save, post_delete], sender=Step)
+def invalidate_reply_list_counts(sender, **kwargs):
+    """Сбрасывает закэшированные total списков откликов."""
+    invalidate_pagination_counts()
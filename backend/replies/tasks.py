@@ -1,4 +1,8 @@
+from datetime import date
+
 from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
 
 from app.celery import celery
 from app.utils import prepare_and_send_templated_email
@@ -7,7 +11,19 @@ from replies.models import Step, TestDriveReply, VacancyReserveReply
 
 @celery.task
 def send_interview_notify():
-    Step.objects.interview_notify_new_boss()
+    """Делит шаги, по которым нужно напоминание, на диапазоны id по REMINDER_SHARD_SIZE и отправляет их параллельно.
+    Дата напоминания передается в задачи, чтобы все диапазоны считались от одного дня."""
+    today = timezone.now().date()
+    bounds = Step.objects.interview_notify_due(today).aggregate(id_min=Min('id'), id_max=Max('id'))
+    if bounds['id_min'] is None:
+        return
+    for id_from in range(bounds['id_min'], bounds['id_max'] + 1, settings.REMINDER_SHARD_SIZE):
+        send_interview_notify_shard.delay(id_from, id_from + settings.REMINDER_SHARD_SIZE, today.isoformat())
+
+
+@celery.task
+def send_interview_notify_shard(id_from: int, id_to: int, today: str):
+    Step.objects.interview_notify_new_boss(id_from, id_to, date.fromisoformat(today))
 
 
 @celery.task
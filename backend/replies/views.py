@@ -3,7 +3,7 @@ from django.db.models.functions import Concat
 from rest_framework import generics
 from rest_framework.response import Response
 
-from app.pagination import DataWrappingLimitOffsetPagination
+from app.pagination import DataWrappingKeysetPagination
 from app.responses import NoContentResponse
 from core.permissions import ObjectOwnerOrAdminUser
 from replies.enums import ReplyStatusChoices, StepStateChoices
@@ -24,7 +24,7 @@ from users.permissions import IsHeadHR, IsHR, IsManager
 
 class ReplyOutboxListView(generics.ListAPIView):
     serializer_class = ReplyOutboxSerializer
-    pagination_class = DataWrappingLimitOffsetPagination
+    pagination_class = DataWrappingKeysetPagination
 
     def get_queryset(self):
         q = Q(user=self.request.user)
@@ -39,14 +39,14 @@ class ReplyOutboxListView(generics.ListAPIView):
 class ReplyInboxListView(generics.ListAPIView):
     # По логике на самом деле во входящих пользователям доступны шаги по заявкам, а не сами заявки
     serializer_class = ReplyInboxListSerializer
-    pagination_class = DataWrappingLimitOffsetPagination
+    pagination_class = DataWrappingKeysetPagination
     permission_classes = (IsHR | IsManager | IsHeadHR,)
 
     def get_queryset(self):
         # Только активные или завершенные шаги
         q = Q(state__in=(StepStateChoices.ACTIVE, StepStateChoices.END))
 
-        if not (self.request.user.has_perm('users.is_hr') or self.request.user.has_perm('users.is_head_hr')):
+        if not (self.request.user.roles['is_hr'] or self.request.user.roles['is_head_hr']):
             q &= Q(user=self.request.user)
 
         status = self.request.query_params.get('status')
@@ -1,14 +1,12 @@
-from django.conf import settings
 from django.contrib import admin, messages
 
-from .models import SapRequest
+from .models import SapOutbox, SapRequest
 from .tasks import create_instances
-from .utils import chunks
 
 
 @admin.register(SapRequest)
 class SapRequestAdmin(admin.ModelAdmin):
-    list_display = ('guid', 'status', 'endpoint', 'created', 'task')
+    list_display = ('guid', 'status', 'endpoint', 'created', 'task', 'import_stats')
     list_editable = ('status',)
     search_fields = ('guid', 'status')
     list_filter = ('status',)
@@ -19,8 +17,11 @@ class SapRequestAdmin(admin.ModelAdmin):
 
         for sap_request in queryset:
             object_type = sap_request.request_body.get('objectType', '')
-            for batch in chunks(sap_request.response_sap.get(object_type, []), settings.SAP_DATA_BATCH_SIZE):
-                create_instances.delay(object_type=object_type, data=batch)
+            create_instances.delay(
+                object_type=object_type,
+                data=sap_request.response_sap.get(object_type, []),
+                guid=sap_request.guid
+            )
 
     @admin.action(description='Отправить повторно')
     def resend_saprequest(self, request, queryset):
@@ -31,3 +32,11 @@ class SapRequestAdmin(admin.ModelAdmin):
                 message='Отпоавлены повторно.',
                 level=messages.INFO
             )
+
+
+@admin.register(SapOutbox)
+class SapOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'message_type', 'object_id', 'vacancy_id', 'status', 'attempts', 'next_attempt_at', 'created')
+    list_filter = ('status', 'message_type')
+    search_fields = ('object_id', 'vacancy_id')
+    raw_id_fields = ('sap_request',)
@@ -1,7 +1,7 @@
 import base64
 import logging
 import uuid
-from typing import Union
+from typing import Tuple
 
 import httpx
 from django.conf import settings
@@ -9,8 +9,9 @@ from django.conf import settings
 from replies.models import Reply
 from vacancies.models import Vacancy
 
-from .enum import SapMessageType, SapStatus
-from .models import SapRequest
+from .enum import SapOutboxMessageType, SapStatus
+from .models import SapOutbox, SapRequest
+from .payload import SapPayload
 from .serializers import SapExtensionPublication, SapReplySerializer, SapVacancySerializer
 
 logger = logging.getLogger(__name__)
@@ -19,7 +20,13 @@ logger = logging.getLogger(__name__)
 class SAPHTTPClient:
     def __init__(self):
         self.authentication_str = f"{settings.SAP_HR_TECH_USERNAME}:{settings.SAP_HR_TECH_PASSWORD}".encode('ascii')
-        self.http_client = httpx.Client(verify=False)
+        self.http_client = httpx.Client(
+            verify=False,
+            limits=httpx.Limits(
+                max_connections=settings.SAP_OUTBOX_CONCURRENCY,
+                max_keepalive_connections=settings.SAP_OUTBOX_CONCURRENCY,
+            ),
+        )
         self.base_url = settings.SAP_HR_BASE_URL
         self.headers = {
             'Content-Type': 'application/json',
@@ -43,84 +50,36 @@ class SAPHTTPClient:
         else:
             logger.error(f"Error with sending request to SAP. Received response status - {resp.status_code}")
 
-    def send_vacancy(self, vacancy_id):
-        guid = uuid.uuid4()
-        vacancy = Vacancy.objects.get(id=vacancy_id)
-        url = f'{self.base_url}/{settings.SAP_HR_VACANCY_ENDPOINT}'
-        serializer = SapVacancySerializer(vacancy)
-        data = {
-            "guid": str(guid),
-        }
-        data.update(serializer.data)
-        resp = self.http_client.post(
-            url=url, json=data, headers=self.headers
+    def post(self, endpoint: str, payload: SapPayload) -> httpx.Response:
+        url = f'{self.base_url}/{endpoint}'
+        if not payload.attachment:
+            return self.http_client.post(url=url, json=payload.data, headers=self.headers)
+        return self.http_client.post(
+            url=url,
+            content=payload.stream(),
+            headers={**self.headers, 'Content-Length': str(payload.content_length)}
         )
-        if resp.status_code == 202:
-            logger.info(f"Received response for information with number {guid}")
-            SapRequest.objects.create(guid=guid,
-                                      endpoint=settings.SAP_HR_VACANCY_ENDPOINT,
-                                      task=f'send_vacancy({vacancy_id})',
-                                      status=SapStatus.SENT,
-                                      request_body=data)
-        else:
-            logger.error(f"Error with sending request to SAP. Received response status - {resp.status_code}")
 
-    def send_extension_vacancy_publication(self, vacancy_id):
-        guid = uuid.uuid4()
-        vacancy = Vacancy.objects.get(id=vacancy_id)
-        url = f'{self.base_url}/{settings.SAP_HR_VACANCY_EXTEND_ENDPOINT}'
-        serializer = SapExtensionPublication(vacancy)
+    def build_message(self, message: SapOutbox) -> Tuple[str, SapPayload, str]:
+        """Собирает сообщение из очереди: endpoint, тело запроса и описание для SapRequest.task."""
         data = {
-            "guid": str(guid),
+            "guid": str(uuid.uuid4()),
         }
-        data.update(serializer.data)
-        resp = self.http_client.post(
-            url=url, json=data, headers=self.headers
-        )
-        if resp.status_code == 202:
-            logger.info(f"Received response for information with number {guid}")
-            SapRequest.objects.create(guid=guid,
-                                      endpoint=settings.SAP_HR_VACANCY_EXTEND_ENDPOINT,
-                                      task=f'send_extension_vacancy_publication({vacancy_id})',
-                                      status=SapStatus.SENT,
-                                      request_body=data)
-        else:
-            logger.error(f"Error with sending request to SAP. Received response status - {resp.status_code}")
-
-    def update_reply_in_sap(
-            self,
-            reply_id: int,
-            message_type: Union[
-                SapMessageType.FEEDBACK.value,
-                SapMessageType.RESUME_STATUS.value,
-                SapMessageType.INTERVIEW_STATUS.value
-            ]
-    ):
-        guid = uuid.uuid4()
-        reply = Reply.objects.get(id=reply_id)
-        url = f'{self.base_url}/{settings.SAP_HR_CANDIDATE_ENDPOINT}'
-
-        if message_type in SapMessageType:
-
-            serializer = SapReplySerializer(
-                reply,
-                context={'message_type': message_type}
+        if message.message_type == SapOutboxMessageType.VACANCY:
+            vacancy = Vacancy.objects.get(id=message.object_id)
+            data.update(SapVacancySerializer(vacancy).data)
+            return settings.SAP_HR_VACANCY_ENDPOINT, SapPayload(data), f'send_vacancy({message.object_id})'
+        if message.message_type == SapOutboxMessageType.VACANCY_EXTENSION:
+            vacancy = Vacancy.objects.get(id=message.object_id)
+            data.update(SapExtensionPublication(vacancy).data)
+            return (
+                settings.SAP_HR_VACANCY_EXTEND_ENDPOINT, SapPayload(data),
+                f'send_extension_vacancy_publication({message.object_id})'
             )
-            data = {
-                "guid": str(guid),
-            }
-            data.update(serializer.data)
-            resp = self.http_client.post(
-                url=url, json=data, headers=self.headers
-            )
-            if resp.status_code == 202:
-                logger.info(f"Received response for information with number {guid}")
-                SapRequest.objects.create(guid=guid,
-                                          endpoint=settings.SAP_HR_CANDIDATE_ENDPOINT,
-                                          status=SapStatus.SENT,
-                                          task=f'update_reply_in_sap({reply_id}, "{message_type}")',
-                                          request_body=data)
-            else:
-                logger.error(f"Error with sending request to SAP. Received response status - {resp.status_code}")
-        else:
-            logger.error("Message type is wrong! Check SapMessageType. Skip sending status to sap.")
+        reply = Reply.objects.get(id=message.object_id)
+        data.update(SapReplySerializer(reply, context={'message_type': message.message_type}).data)
+        attachment = reply.resume.name if message.message_type == SapOutboxMessageType.FEEDBACK and reply.resume else None
+        return (
+            settings.SAP_HR_CANDIDATE_ENDPOINT, SapPayload(data, attachment=attachment),
+            f'update_reply_in_sap({message.object_id}, "{message.message_type}")'
+        )
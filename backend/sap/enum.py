@@ -11,3 +11,19 @@ class SapMessageType(models.TextChoices):
     FEEDBACK = 'feedback', 'Отклик'
     RESUME_STATUS = 'resume_status', 'Статус резюме'
     INTERVIEW_STATUS = 'interview_status', 'Статус интервью с руководителем'
+
+
+class SapOutboxMessageType(models.TextChoices):
+    VACANCY = 'vacancy', 'Вакансия'
+    VACANCY_EXTENSION = 'vacancy_extension', 'Продление публикации вакансии'
+    FEEDBACK = SapMessageType.FEEDBACK.value, SapMessageType.FEEDBACK.label
+    RESUME_STATUS = SapMessageType.RESUME_STATUS.value, SapMessageType.RESUME_STATUS.label
+    INTERVIEW_STATUS = SapMessageType.INTERVIEW_STATUS.value, SapMessageType.INTERVIEW_STATUS.label
+
+
+class SapOutboxStatus(models.TextChoices):
+    PENDING = 'pending', 'Ожидает отправки'
+    SENDING = 'sending', 'Отправляется'
+    SENT = 'sent', 'Отправлено'
+    SUPERSEDED = 'superseded', 'Заменено новым сообщением'
+    ERROR = 'error', 'Ошибка'
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sap.outbox import SapOutboxDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Постоянная отправка очереди сообщений в SAP. ' \
+           'Можно запускать несколько экземпляров, сообщения между ними не дублируются.'
+
+    def handle(self, *args, **options):
+        dispatcher = SapOutboxDispatcher()
+        try:
+            dispatcher.run_forever()
+        finally:
+            dispatcher.close()
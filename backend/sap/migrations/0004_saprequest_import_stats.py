@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sap', '0003_extra_sap_request_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saprequest',
+            name='import_stats',
+            field=models.JSONField(blank=True, help_text='Результат загрузки справочника: количество созданных, обновленных, неизмененных и пропущенных записей', null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sap', '0004_saprequest_import_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SapOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('message_type', models.CharField(choices=[('vacancy', 'Вакансия'), ('vacancy_extension', 'Продление публикации вакансии'), ('feedback', 'Отклик'), ('resume_status', 'Статус резюме'), ('interview_status', 'Статус интервью с руководителем')], max_length=40, verbose_name='Тип сообщения')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Id вакансии или отклика')),
+                ('vacancy_id', models.PositiveIntegerField(blank=True, help_text='Сообщения по одной вакансии отправляются строго по порядку', null=True, verbose_name='Id вакансии')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('error', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Количество попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('sap_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_messages', to='sap.saprequest')),
+            ],
+            options={
+                'verbose_name': 'Сообщение в Sap',
+                'verbose_name_plural': 'Очередь сообщений в Sap',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sapoutbox',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at', 'id'], name='sap_outbox_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sapoutbox',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('message_type', 'object_id'), name='sap_outbox_pending_unique'),
+        ),
+    ]
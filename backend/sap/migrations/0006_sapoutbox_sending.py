@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sap', '0005_sapoutbox'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sapoutbox',
+            name='sap_outbox_pending_idx',
+        ),
+        migrations.AlterField(
+            model_name='sapoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('superseded', 'Заменено новым сообщением'), ('error', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='sapoutbox',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'sending'))), fields=['next_attempt_at', 'id'], name='sap_outbox_pending_idx'),
+        ),
+    ]
@@ -1,10 +1,13 @@
 import logging
+from typing import Optional
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 
 from app.models import TimestampedModel
 
-from .enum import SapStatus
+from .enum import SapOutboxMessageType, SapOutboxStatus, SapStatus
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,11 @@ class SapRequest(TimestampedModel):
         null=True,
         help_text='Название celery task, которым был текущий sap request создан'
     )
+    import_stats = models.JSONField(
+        null=True,
+        blank=True,
+        help_text='Результат загрузки справочника: количество созданных, обновленных, неизмененных и пропущенных записей'
+    )
 
     class Meta:
         verbose_name = 'Запрос в Sap'
@@ -28,15 +36,64 @@ class SapRequest(TimestampedModel):
 
     def send(self):
         from .clients import SAPHTTPClient
+        from .payload import SapPayload
         client = SAPHTTPClient()
-        resp = client.http_client.post(
-            url=f'{client.base_url}/{self.endpoint}',
-            json=self.request_body,
-            headers=client.headers
-        )
+        resp = client.post(self.endpoint, SapPayload.from_request_body(self.request_body))
         if resp.status_code == 202:
             logger.info(f"Received response for information with number {self.guid}")
             self.status = SapStatus.SENT
             self.save()
         else:
             logger.error(f"Error with sending request to SAP. Received response status - {resp.status_code}")
+
+
+class SapOutbox(TimestampedModel):
+    """Сообщение для SAP, записывается в одной транзакции с изменением вакансии или отклика.
+    Отправляется диспетчером (sap.outbox.SapOutboxDispatcher), данные сообщения собираются в момент отправки.
+    Пока сообщение ожидает отправки, повторное сообщение того же типа по тому же объекту не создается.
+    Сообщение, взятое в отправку (SENDING), в уникальный индекс не входит: изменение объекта во время отправки
+    ставит в очередь новое сообщение, и SAP получит актуальное состояние.
+    """
+    message_type = models.CharField('Тип сообщения', max_length=40, choices=SapOutboxMessageType.choices)
+    object_id = models.PositiveIntegerField('Id вакансии или отклика')
+    vacancy_id = models.PositiveIntegerField(
+        'Id вакансии', null=True, blank=True,
+        help_text='Сообщения по одной вакансии отправляются строго по порядку'
+    )
+    status = models.CharField(
+        'Статус', max_length=20, choices=SapOutboxStatus.choices, default=SapOutboxStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField('Количество попыток', default=0)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    sap_request = models.ForeignKey(
+        SapRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_messages'
+    )
+
+    class Meta:
+        verbose_name = 'Сообщение в Sap'
+        verbose_name_plural = 'Очередь сообщений в Sap'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('message_type', 'object_id'),
+                condition=Q(status=SapOutboxStatus.PENDING),
+                name='sap_outbox_pending_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('next_attempt_at', 'id'),
+                condition=Q(status__in=(SapOutboxStatus.PENDING, SapOutboxStatus.SENDING)),
+                name='sap_outbox_pending_idx',
+            ),
+        ]
+
+    @staticmethod
+    def enqueue(message_type: str, object_id: int, vacancy_id: Optional[int] = None):
+        """Ставит сообщение в очередь в текущей транзакции, после коммита будит диспетчер."""
+        SapOutbox.objects.bulk_create(
+            [SapOutbox(message_type=message_type, object_id=object_id, vacancy_id=vacancy_id)],
+            ignore_conflicts=True,
+        )
+        from .tasks import dispatch_sap_outbox
+        transaction.on_commit(dispatch_sap_outbox.delay)
@@ -0,0 +1,153 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+
+import httpx
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .clients import SAPHTTPClient
+from .enum import SapOutboxStatus, SapStatus
+from .models import SapOutbox, SapRequest
+from .payload import SapPayload
+
+logger = logging.getLogger(__name__)
+
+
+class SapOutboxDispatcher:
+    """Отправка очереди сообщений в SAP.
+    Сообщения забираются пачками (SAP_OUTBOX_BATCH_SIZE) через select_for_update(skip_locked) и в той же короткой
+    транзакции переводятся в статус SENDING, поэтому несколько диспетчеров не отправят одно сообщение дважды.
+    Сборка и отправка идут вне транзакции, итоговый статус записывается второй короткой транзакцией.
+    По каждой вакансии берется только самое раннее неотправленное сообщение - следующее уйдет после успешной отправки
+    или окончательной ошибки предыдущего.
+    Запросы отправляются параллельно (не более SAP_OUTBOX_CONCURRENCY) через один пул соединений.
+    Ошибка или ответ не 202 - повтор с экспоненциальной задержкой, после SAP_OUTBOX_MAX_ATTEMPTS попыток - статус ERROR.
+    """
+    update_fields = ('status', 'attempts', 'next_attempt_at', 'last_error', 'sap_request', 'modified')
+
+    def __init__(self):
+        self.client = SAPHTTPClient()
+        self.executor = ThreadPoolExecutor(max_workers=settings.SAP_OUTBOX_CONCURRENCY)
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.http_client.close()
+
+    def claim_batch(self) -> List[SapOutbox]:
+        """Забирает пачку сообщений в отправку.
+        Сообщения в статусе SENDING дольше SAP_OUTBOX_SENDING_TIMEOUT (диспетчер упал во время отправки) забираются снова.
+        """
+        in_progress = (SapOutboxStatus.PENDING, SapOutboxStatus.SENDING)
+        earlier_in_progress = SapOutbox.objects.filter(
+            status__in=in_progress, vacancy_id=OuterRef('vacancy_id'), id__lt=OuterRef('id')
+        )
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                SapOutbox.objects.filter(
+                    status__in=in_progress, next_attempt_at__lte=now
+                ).filter(
+                    ~Exists(earlier_in_progress)
+                ).order_by('id').select_for_update(skip_locked=True)[:settings.SAP_OUTBOX_BATCH_SIZE]
+            )
+            for message in batch:
+                message.status = SapOutboxStatus.SENDING
+                message.next_attempt_at = now + timedelta(seconds=settings.SAP_OUTBOX_SENDING_TIMEOUT)
+                message.modified = now
+            SapOutbox.objects.bulk_update(batch, fields=('status', 'next_attempt_at', 'modified'))
+        return batch
+
+    def post(self, endpoint: str, payload: SapPayload) -> Optional[str]:
+        """Отправляет запрос в SAP, возвращает текст ошибки или None."""
+        try:
+            resp = self.client.post(endpoint, payload)
+        except (httpx.HTTPError, OSError) as e:
+            return f'Error with sending request to SAP: {e!r}'
+        if resp.status_code != 202:
+            return f'Error with sending request to SAP. Received response status - {resp.status_code}'
+        return None
+
+    def dispatch_once(self) -> int:
+        """Отправляет одну пачку, возвращает количество обработанных сообщений."""
+        batch = self.claim_batch()
+        requests = {}
+        for message in batch:
+            try:
+                requests[message.id] = self.client.build_message(message)
+            except Exception as e:
+                logger.exception(f'Не удалось собрать сообщение {message.message_type} ({message.object_id}) для SAP')
+                message.attempts = settings.SAP_OUTBOX_MAX_ATTEMPTS
+                self.on_failure(message, repr(e))
+
+        sendable = [message for message in batch if message.id in requests]
+        results = self.executor.map(
+            lambda message: self.post(*requests[message.id][:2]), sendable
+        )
+        errors = dict(zip((message.id for message in sendable), results))
+
+        with transaction.atomic():
+            for message in sendable:
+                error = errors[message.id]
+                if error:
+                    logger.warning(f'{error}. Сообщение {message.message_type} ({message.object_id})')
+                    self.on_failure(message, error)
+                else:
+                    self.on_success(message, *requests[message.id])
+            retry = [message for message in batch if message.status == SapOutboxStatus.PENDING]
+            SapOutbox.objects.bulk_update(
+                [message for message in batch if message.status != SapOutboxStatus.PENDING], fields=self.update_fields
+            )
+            for message in retry:
+                self.save_for_retry(message)
+        return len(batch)
+
+    def save_for_retry(self, message: SapOutbox):
+        """Возвращает сообщение в очередь.
+        Если пока оно отправлялось, по тому же объекту поставлено новое сообщение (уникальный индекс по PENDING),
+        повторять незачем - новое сообщение соберется из актуальных данных.
+        """
+        try:
+            with transaction.atomic():
+                message.save(update_fields=self.update_fields)
+        except IntegrityError:
+            logger.info(f'Сообщение {message.message_type} ({message.object_id}) заменено новым сообщением')
+            message.status = SapOutboxStatus.SUPERSEDED
+            message.save(update_fields=self.update_fields)
+
+    def on_success(self, message: SapOutbox, endpoint: str, payload: SapPayload, task: str):
+        logger.info(f"Received response for information with number {payload.guid}")
+        message.sap_request = SapRequest.objects.create(
+            guid=payload.guid, endpoint=endpoint, task=task, status=SapStatus.SENT, request_body=payload.request_body
+        )
+        message.status = SapOutboxStatus.SENT
+        message.attempts += 1
+        message.last_error = ''
+        message.modified = timezone.now()
+
+    def on_failure(self, message: SapOutbox, error: str):
+        message.attempts += 1
+        message.last_error = error
+        message.modified = timezone.now()
+        if message.attempts >= settings.SAP_OUTBOX_MAX_ATTEMPTS:
+            logger.error(f'Сообщение {message.message_type} ({message.object_id}) не отправлено в SAP: {error}')
+            message.status = SapOutboxStatus.ERROR
+        else:
+            message.status = SapOutboxStatus.PENDING
+            message.next_attempt_at = timezone.now() + timedelta(
+                seconds=settings.SAP_OUTBOX_RETRY_BACKOFF * 2 ** (message.attempts - 1)
+            )
+
+    def drain(self):
+        """Отправляет очередь, пока есть готовые к отправке сообщения."""
+        while self.dispatch_once():
+            pass
+
+    def run_forever(self):
+        while True:
+            if not self.dispatch_once():
+                time.sleep(settings.SAP_OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import json
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Значение поля вложения в данных сообщения, при отправке заменяется на файл в base64
+ATTACHMENT_PLACEHOLDER = '__attachment__'
+
+
+def replace_value(data: Any, old: Any, new: Any) -> Any:
+    if data == old:
+        return new
+    if isinstance(data, dict):
+        return {key: replace_value(value, old, new) for key, value in data.items()}
+    if isinstance(data, list):
+        return [replace_value(value, old, new) for value in data]
+    return data
+
+
+def iter_file_chunks(file_name: str, chunk_size: int) -> Iterator[bytes]:
+    """Читает файл из хранилища кусками.
+    Файл S3 читается из потока ответа, а не через S3File.read, который сначала скачивает объект целиком.
+    """
+    file = default_storage.open(file_name, 'rb')
+    try:
+        if hasattr(file, 'obj'):
+            yield from file.obj.get()['Body'].iter_chunks(chunk_size)
+        else:
+            yield from file.chunks(chunk_size)
+    finally:
+        file.close()
+
+
+class SapPayload:
+    """Тело запроса в SAP.
+    Если в данных есть ATTACHMENT_PLACEHOLDER, JSON отправляется потоком: файл вложения читается кусками
+    и кодируется в base64 на лету, целиком в памяти не держится ни файл, ни его base64.
+    В SapRequest.request_body вместо содержимого вложения сохраняется ссылка на файл, его размер и sha256.
+    """
+
+    def __init__(self, data: dict, attachment: Optional[str] = None):
+        self.data = data
+        self.attachment = attachment
+        self.sha256 = hashlib.sha256()
+        if attachment:
+            self.size = default_storage.size(attachment)
+            self.prefix, self.suffix = json.dumps(data).encode().split(json.dumps(ATTACHMENT_PLACEHOLDER).encode())
+
+    @classmethod
+    def from_request_body(cls, request_body: dict) -> 'SapPayload':
+        """Payload для повторной отправки сохраненного SapRequest."""
+        feedback = request_body.get('feedback') or {}
+        reference = feedback.get('attachment')
+        if isinstance(reference, dict) and reference.get('file'):
+            return cls(replace_value(request_body, reference, ATTACHMENT_PLACEHOLDER), attachment=reference['file'])
+        return cls(request_body)
+
+    @property
+    def guid(self) -> str:
+        return self.data['guid']
+
+    @property
+    def content_length(self) -> int:
+        return len(self.prefix) + 2 + (self.size + 2) // 3 * 4 + len(self.suffix)
+
+    def stream(self) -> Iterator[bytes]:
+        self.sha256 = hashlib.sha256()
+        yield self.prefix + b'"'
+        rest = b''
+        for chunk in iter_file_chunks(self.attachment, settings.SAP_ATTACHMENT_CHUNK_SIZE):
+            self.sha256.update(chunk)
+            chunk = rest + chunk
+            # base64 кодирует по 3 байта, остаток переносим в следующий кусок
+            split = len(chunk) - len(chunk) % 3
+            rest = chunk[split:]
+            yield base64.b64encode(chunk[:split])
+        yield base64.b64encode(rest) + b'"' + self.suffix
+
+    @property
+    def request_body(self) -> dict:
+        if not self.attachment:
+            return self.data
+        return replace_value(self.data, ATTACHMENT_PLACEHOLDER, {
+            'file': self.attachment,
+            'size': self.size,
+            'sha256': self.sha256.hexdigest(),
+        })
@@ -1,9 +1,9 @@
-import base64
 import logging
 from collections import OrderedDict
-from typing import Tuple
+from typing import Dict, Iterable, List, Tuple
 
 from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 
 from company.enums import SelectionTypeChoices
@@ -21,51 +21,108 @@ from vacancies.models import (
     WorkExperience
 )
 
+from .payload import ATTACHMENT_PLACEHOLDER
+
 logger = logging.getLogger(__name__)
 
 
-class SapGradeSerializer(serializers.ModelSerializer):
-    id = serializers.CharField(source='title')
+class SapDictionaryListSerializer(serializers.ListSerializer):
+    """Загрузка справочника SAP целиком.
+    Существующие записи читаются одним запросом и сравниваются с данными SAP по естественному ключу
+    (child.key_fields), новые создаются через bulk_create, измененные (child.update_fields) - через bulk_update
+    в одной транзакции. Количество созданных, обновленных, неизмененных и пропущенных записей - в self.stats.
+    """
+
+    def create(self, validated_data: List[dict]):
+        model = self.child.Meta.model
+        key_fields = self.child.key_fields
+        update_fields = self.child.update_fields
+        rows = self.child.prepare_rows(validated_data)
+        skipped = len(validated_data) - len(rows)
+        # Повторы ключа в данных SAP схлопываются, берется последняя запись
+        rows = {self.get_key(row[field] for field in key_fields): row for row in rows}
+
+        existing: Dict[tuple, list] = {}
+        for obj in model.objects.all():
+            existing.setdefault(self.get_key(getattr(obj, field) for field in key_fields), []).append(obj)
+
+        to_create, to_update, unchanged = [], [], []
+        for key, row in rows.items():
+            objs = existing.get(key)
+            if not objs:
+                to_create.append(model(**row))
+                continue
+            for obj in objs:
+                if all(getattr(obj, field) == row[field] for field in update_fields):
+                    unchanged.append(obj)
+                else:
+                    for field in update_fields:
+                        setattr(obj, field, row[field])
+                    to_update.append(obj)
+
+        with transaction.atomic():
+            model.objects.bulk_create(to_create, batch_size=settings.SAP_DATA_BATCH_SIZE)
+            if to_update:
+                model.objects.bulk_update(to_update, fields=update_fields, batch_size=settings.SAP_DATA_BATCH_SIZE)
+
+        self.stats = {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'unchanged': len(unchanged),
+            'skipped': skipped,
+        }
+        return to_create + to_update + unchanged
 
-    def create(self, validated_data):
-        rate, _ = Rate.objects.get_or_create(
-            title=validated_data.get('title')
-        )
-        return rate
+    @staticmethod
+    def get_key(values: Iterable) -> tuple:
+        # NULL и пустая строка считаются одним значением, иначе такие записи не сопоставятся и задвоятся
+        return tuple('' if value is None else value for value in values)
+
+
+class SapDictionaryBaseSerializer(serializers.ModelSerializer):
+    """Справочник SAP, сохраняется только списком (many=True) через SapDictionaryListSerializer."""
+    key_fields: Tuple[str, ...] = ('title',)
+    update_fields: Tuple[str, ...] = ('sap_id',)
+
+    def prepare_rows(self, validated_data: List[dict]) -> List[dict]:
+        """Значения полей модели для каждой записи, записи без обязательных связей отбрасываются."""
+        return validated_data
+
+
+class SapGradeSerializer(SapDictionaryBaseSerializer):
+    id = serializers.CharField(source='title')
+    update_fields = ()
 
     class Meta:
         model = Rate
         fields = ('id',)
+        list_serializer_class = SapDictionaryListSerializer
 
 
-class SapCitySerializer(serializers.ModelSerializer):
+class SapCitySerializer(SapDictionaryBaseSerializer):
     textcity = serializers.CharField(source='name')
     idcityhh = serializers.CharField(source='sap_id')
+    key_fields = ('name',)
 
     class Meta:
         model = City
         fields = ('textcity', 'idcityhh')
+        list_serializer_class = SapDictionaryListSerializer
 
-    def create(self, validated_data):
-        name = validated_data.get('name')
-        sap_id = validated_data.get('sap_id')
-        city, _ = City.objects.update_or_create(
-            name=name,
-            defaults={'sap_id': sap_id}
-        )
-        return city
 
-
-class SapOfficeSerializer(serializers.ModelSerializer):
+class SapOfficeSerializer(SapDictionaryBaseSerializer):
     idcityhh = serializers.CharField(source='sap_city_id')
     idoffice = serializers.CharField(source='sap_id')
     idcomp = serializers.CharField(source='sap_company_id')
     idfilial = serializers.CharField(source='sap_branch_id')
+    key_fields = ('city_id', 'sap_city_id', 'sap_company_id', 'sap_branch_id', 'sap_id', 'street', 'building')
+    update_fields = ('company', 'branch')
 
     class Meta:
         model = Office
         fields = ('idcityhh', 'idoffice', 'idcomp',
                   'idfilial', 'street', 'building')
+        list_serializer_class = SapDictionaryListSerializer
 
     def get_text_info_from_ids(self, idcomp: str, idfilial: str) -> Tuple[str, str]:
         id_to_text_map = {
@@ -173,90 +230,73 @@ class SapOfficeSerializer(serializers.ModelSerializer):
         }
         return id_to_text_map[idcomp]['textcomp'], id_to_text_map[idcomp]['filials'][idfilial]
 
-    def create(self, validated_data: dict):
-        city = City.objects.filter(sap_id=validated_data.get('sap_city_id')).first()
-        if city:
+    def prepare_rows(self, validated_data: List[dict]) -> List[dict]:
+        cities = {
+            city.sap_id: city
+            for city in City.objects.filter(sap_id__in={data.get('sap_city_id') for data in validated_data})
+        }
+        rows = []
+        for data in validated_data:
+            city = cities.get(data.get('sap_city_id'))
+            if not city:
+                logger.error(f'City with sap_id {data.get("sap_city_id")} doesn\'t exist! Skip creating office..')
+                continue
             company, branch = self.get_text_info_from_ids(
-                idcomp=validated_data.get('sap_company_id'),
-                idfilial=validated_data.get('sap_branch_id')
-            )
-            office, _ = Office.objects.get_or_create(
-                city=city,
-                sap_city_id=validated_data.get('sap_city_id'),
-                sap_company_id=validated_data.get('sap_company_id'),
-                sap_branch_id=validated_data.get('sap_branch_id'),
-                sap_id=validated_data.get('sap_id'),
-                street=validated_data.get('street'),
-                building=validated_data.get('building'),
-                defaults={**validated_data.update({
-                    'company': company,
-                    'branch': branch
-                })}
+                idcomp=data.get('sap_company_id'),
+                idfilial=data.get('sap_branch_id')
             )
-            return office
-        logger.error(f'City with sap_id {validated_data.get("sap_city_id")} doesn\'t exist! Skip creating office..')
+            rows.append({
+                **data,
+                'street': data.get('street') or '',
+                'building': data.get('building') or '',
+                'city_id': city.id,
+                'company': company,
+                'branch': branch,
+            })
+        return rows
 
     def to_representation(self, instance):
         return super(SapOfficeSerializer, self).to_representation(instance) if instance else {}
 
 
-class SapDictionarySerializer(serializers.ModelSerializer):
+class SapDictionarySerializer(SapDictionaryBaseSerializer):
     id = serializers.CharField(source='sap_id')
     name = serializers.CharField(source='title')
 
-    def create_or_update(self, model, validated_data):
-        title = validated_data.get('title')
-        sap_id = validated_data.get('sap_id')
-        obj, _ = model.objects.update_or_create(
-            title=title,
-            defaults={'sap_id': sap_id}
-        )
-        return obj
-
 
 class WorkExperienceSerializer(SapDictionarySerializer):
     class Meta:
         model = WorkExperience
         fields = ('id', 'name')
-
-    def create(self, validated_data):
-        return self.create_or_update(WorkExperience, validated_data)
+        list_serializer_class = SapDictionaryListSerializer
 
 
 class WorkContractSerializer(SapDictionarySerializer):
     class Meta:
         model = WorkContract
         fields = ('id', 'name')
-
-    def create(self, validated_data):
-        return self.create_or_update(WorkContract, validated_data)
+        list_serializer_class = SapDictionaryListSerializer
 
 
 class VacancyTypeSerializer(SapDictionarySerializer):
     class Meta:
         model = VacancyType
         fields = ('id', 'name')
-
-    def create(self, validated_data):
-        return self.create_or_update(VacancyType, validated_data)
+        list_serializer_class = SapDictionaryListSerializer
 
 
 class ContestTypeSerializer(SapDictionarySerializer):
     class Meta:
         model = ContestType
         fields = ('id', 'name')
-
-    def create(self, validated_data):
-        return self.create_or_update(ContestType, validated_data)
+        list_serializer_class = SapDictionaryListSerializer
 
 
 class ReasonSerializer(SapDictionarySerializer):
     class Meta:
         model = Reason
         fields = ('id', 'name')
-
-    def create(self, validated_data):
-        return self.create_or_update(Reason, validated_data)
+        list_serializer_class = SapDictionaryListSerializer
 
 
 class SapVacancySerializer(serializers.ModelSerializer):
@@ -389,7 +429,7 @@ class SapReplySerializer(serializers.ModelSerializer):
             feedback_info.update({
                 'att_type': instance.resume.name.split('.')[-1],
                 'att_header': instance.resume.name.split('/')[-1],
-                'attachment': base64.b64encode(instance.resume.read()).decode()
+                'attachment': ATTACHMENT_PLACEHOLDER
             })
         return feedback_info
 
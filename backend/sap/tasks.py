@@ -1,13 +1,14 @@
 import logging
-from typing import List
+from typing import List, Optional
 
 from app import settings
 from app.celery import celery
 from app.utils import prepare_and_send_templated_email
 
 from .clients import SAPHTTPClient
-from .enum import SapMessageType, SapStatus
-from .models import SapRequest
+from .enum import SapOutboxStatus, SapStatus
+from .models import SapOutbox, SapRequest
+from .outbox import SapOutboxDispatcher
 from .serializers import (
     ContestTypeSerializer,
     ReasonSerializer,
@@ -73,7 +74,8 @@ def update_work_experiences_from_sap():
 @celery.task
 def create_instances(
         object_type: str,
-        data: List[dict]
+        data: List[dict],
+        guid: Optional[str] = None
 ) -> None:
     serializer_map = {
         'grade': SapGradeSerializer,
@@ -84,47 +86,29 @@ def create_instances(
         'reason': ReasonSerializer,
         'work_contract': WorkContractSerializer,
         'work_experience': WorkExperienceSerializer
-
     }
 
     serializer = serializer_map.get(object_type)(data=data, many=True)
     serializer.is_valid(raise_exception=True)
     serializer.save()
+    logger.info(f'Загрузка справочника {object_type} из SAP: {serializer.stats}')
+    if guid:
+        SapRequest.objects.filter(guid=guid).update(import_stats=serializer.stats)
 
 
 @celery.task
 def delete_successful_saprequests():
+    SapOutbox.objects.filter(status__in=(SapOutboxStatus.SENT, SapOutboxStatus.SUPERSEDED)).delete()
     SapRequest.objects.filter(status=SapStatus.SUCCESS).delete()
 
 
 @celery.task
-def send_candidate_to_sap(reply_id: int):
-    sap_client = SAPHTTPClient()
-    sap_client.update_reply_in_sap(reply_id, SapMessageType.FEEDBACK.value)
-
-
-@celery.task
-def update_reply_resume_status_in_sap(reply_id: int):
-    sap_client = SAPHTTPClient()
-    sap_client.update_reply_in_sap(reply_id, SapMessageType.RESUME_STATUS.value)
-
-
-@celery.task
-def update_reply_interview_status_in_sap(reply_id: int):
-    sap_client = SAPHTTPClient()
-    sap_client.update_reply_in_sap(reply_id, SapMessageType.INTERVIEW_STATUS.value)
-
-
-@celery.task
-def send_vacancy_to_sap(vacancy_id: int):
-    sap_client = SAPHTTPClient()
-    sap_client.send_vacancy(vacancy_id)
-
-
-@celery.task
-def send_extension_vacancy_publication(vacancy_id: int):
-    sap_client = SAPHTTPClient()
-    sap_client.send_extension_vacancy_publication(vacancy_id)
+def dispatch_sap_outbox():
+    dispatcher = SapOutboxDispatcher()
+    try:
+        dispatcher.drain()
+    finally:
+        dispatcher.close()
 
 
 @celery.task
@@ -16,7 +16,6 @@ from .serializers import (
     SapRejectReplySerializer
 )
 from .tasks import create_instances
-from .utils import chunks
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +38,7 @@ class SapCallbackView(APIView):
                 object_type = request.data.get('objectType')
                 data = request.data.get(object_type, [])
 
-                for batch in chunks(data, settings.SAP_DATA_BATCH_SIZE):
-                    create_instances.delay(object_type=object_type, data=batch)
+                create_instances.delay(object_type=object_type, data=data, guid=saprequest.guid)
 
                 return Response(status=201)
 
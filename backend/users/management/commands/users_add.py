@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from core.utils import get_employee_data
+from core.clients import get_employee_client
 from users.models import User
 from users.serializers import UserEmployeeInfoSerializer
 
@@ -15,7 +15,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         for personnel_number in options['personnel_numbers']:
-            employee_data = get_employee_data(url='employee', params={"pn": personnel_number})
+            employee_data = get_employee_client().get(url='employee', params={"pn": personnel_number})
             if employee_data:
                 serializer = UserEmployeeInfoSerializer(data=employee_data['data'])
                 if serializer.is_valid():
@@ -1,23 +1,34 @@
 import logging
-from typing import List, Union
+from typing import Dict, List, Union
 
 from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, Permission
 from django.contrib.auth.models import UserManager as StockUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from app.models import TimestampedModel
 from company.models import Unit
-from core.utils import get_employee_data
+from core.clients import get_employee_client
+from core.utils import (
+    bump_cache_version,
+    get_cache_version,
+    get_cached_employee_data,
+    invalidate_employee_cache
+)
 from vacancies.enums import VacancyRateChoices
 
 logger = logging.getLogger(__name__)
 
+# Версия кэша ролей пользователей, меняется при массовом изменении руководителей подразделений
+USER_ROLES_VERSION_KEY = 'user_roles_version'
+
 
 class UserQuerySet(models.QuerySet):
     def with_user_full_name(self):
@@ -38,6 +49,23 @@ class UserQuerySet(models.QuerySet):
         """
         return self.annotate(is_unit_manager=models.Exists(Unit.objects.filter(manager=models.OuterRef('pk'))))
 
+    def with_roles(self):
+        """Добавляет признаки ролей одним запросом: права is_hr, is_head_hr, is_manager
+        (напрямую или через группы) и руководство подразделением.
+        """
+        def has_perm(codename):
+            return models.Exists(Permission.objects.filter(
+                models.Q(user=models.OuterRef('pk')) | models.Q(group__user=models.OuterRef('pk')),
+                content_type__app_label='users',
+                codename=codename,
+            ))
+
+        return self.with_is_unit_manager().annotate(
+            has_hr_perm=has_perm('is_hr'),
+            has_head_hr_perm=has_perm('is_head_hr'),
+            has_manager_perm=has_perm('is_manager'),
+        )
+
 
 class UserManager(StockUserManager, models.Manager.from_queryset(UserQuerySet)):
     def _create_user(self, personnel_number, email, password, **extra_fields):
@@ -153,6 +181,46 @@ class User(AbstractUser, TimestampedModel):
     def __str__(self):
         return self.full_name or self.personnel_number
 
+    @cached_property
+    def roles(self) -> Dict[str, bool]:
+        """Роли пользователя: is_hr, is_head_hr, is_manager."""
+        return User.get_roles(self.pk)
+
+    @staticmethod
+    def get_roles(user_id: int) -> Dict[str, bool]:
+        """Снимок ролей пользователя из кэша, при отсутствии считается одним запросом.
+        Роли совпадают с проверкой через has_perm (с учетом суперпользователя и неактивных пользователей),
+        руководитель подразделения - всегда менеджер.
+        Сбрасывается сигналами при изменении прав, групп и руководителей подразделений.
+        """
+        key = f'user_roles:{get_cache_version(USER_ROLES_VERSION_KEY)}:{user_id}'
+        roles = cache.get(key)
+        if roles is None:
+            roles = User.build_roles(User.objects.with_roles().get(pk=user_id))
+            cache.set(key, roles, timeout=settings.USER_ROLES_TIMEOUT)
+        return roles
+
+    @staticmethod
+    def build_roles(user: 'User') -> Dict[str, bool]:
+        """Роли пользователя из признаков UserQuerySet.with_roles."""
+        is_admin = user.is_active and user.is_superuser
+        return {
+            'is_hr': user.is_active and (is_admin or user.has_hr_perm),
+            'is_head_hr': user.is_active and (is_admin or user.has_head_hr_perm),
+            'is_manager': user.is_active and (is_admin or user.has_manager_perm) or user.is_unit_manager,
+        }
+
+    @staticmethod
+    def invalidate_roles(*user_ids: int):
+        version = get_cache_version(USER_ROLES_VERSION_KEY)
+        keys = [f'user_roles:{version}:{user_id}' for user_id in user_ids if user_id]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @staticmethod
+    def invalidate_all_roles():
+        bump_cache_version(USER_ROLES_VERSION_KEY)
+
     @property
     def full_name(self):
         return ' '.join(f'{self.last_name} {self.first_name} {self.middle_name}'.split())
@@ -163,7 +231,7 @@ class User(AbstractUser, TimestampedModel):
 
     @cached_property
     def manager_level(self) -> str:
-        data = get_employee_data(url='manager_level', params={'personnel_number': self.personnel_number})
+        data = get_cached_employee_data(url='manager_level', params={'personnel_number': self.personnel_number})
         if data:
             return data.get('data').get('manager_level')
         return ''
@@ -177,7 +245,9 @@ class User(AbstractUser, TimestampedModel):
     @cached_property
     def top_performer_rate(self) -> str:
         """Возвращает буквенное обозначение оценки Top Performers сотрудника."""
-        data = get_employee_data(url='employee/topperformerrate', params={'personnel_number': self.personnel_number})
+        data = get_cached_employee_data(
+            url='employee/topperformerrate', params={'personnel_number': self.personnel_number}
+        )
         if not data:
             return ''
         rate = data.get('data').get('category')
@@ -189,7 +259,7 @@ class User(AbstractUser, TimestampedModel):
         """Возвращает иерархию подразделений, в которые входит сотрудник.
         Первый элемент - департамент сотрудника, далее идут родители.
         """
-        data = get_employee_data(url='departments', params={'pn': self.personnel_number})
+        data = get_cached_employee_data(url='departments', params={'pn': self.personnel_number})
         return Unit.load_from_chain(data)[::-1]
 
     @property
@@ -206,18 +276,33 @@ class User(AbstractUser, TimestampedModel):
     def image(self):
         return self.custom_image_url or self.image_url
 
+    @staticmethod
+    def invalidate_employee_cache(*personnel_numbers: str):
+        """Сбрасывает закэшированные данные employee по сотрудникам:
+        уровень руководителя, оценку Top Performers и иерархию подразделений.
+        """
+        lookups = []
+        for personnel_number in personnel_numbers:
+            lookups += [
+                ('manager_level', {'personnel_number': personnel_number}),
+                ('employee/topperformerrate', {'personnel_number': personnel_number}),
+                ('departments', {'pn': personnel_number}),
+            ]
+        invalidate_employee_cache(lookups)
+
     def update_from_employee(self) -> str:
         """
         Обновляет данные о пользователе с сервиса employee.
         В случае наличия ошибки, возвращает ее в текстовом виде.
         """
-        employee_data = get_employee_data(url='employee', params={"pn": self.personnel_number})
+        employee_data = get_employee_client().get(url='employee', params={"pn": self.personnel_number})
         error = ''
         if employee_data:
             from users.serializers import UserEmployeeSerializer
             serializer = UserEmployeeSerializer(data=employee_data['data'], instance=self)
             if serializer.is_valid():
                 serializer.save()
+                self.invalidate_employee_cache(self.personnel_number)
             else:
                 error = """Не удалось обновить данные по сотруднику {personnel_number}\n
                         Ошибки валидации: {errors}.\n
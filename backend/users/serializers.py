@@ -21,14 +21,21 @@ class UserShortInfoSerializer(serializers.ModelSerializer):
         fields = ('id', 'personnel_number', 'full_name', 'username', 'email', 'city',
                   'is_staff', 'is_manager', 'is_hr', 'is_head_hr')
 
+    @staticmethod
+    def get_roles(instance):
+        """Роли из признаков User.objects.with_roles(), если queryset их добавил, иначе - из снимка ролей."""
+        if hasattr(instance, 'has_hr_perm'):
+            return User.build_roles(instance)
+        return instance.roles
+
     def get_is_manager(self, instance):
-        return instance.has_perm('users.is_manager') or Unit.objects.filter(manager=instance).exists()
+        return self.get_roles(instance)['is_manager']
 
     def get_is_hr(self, instance):
-        return instance.has_perm('users.is_hr')
+        return self.get_roles(instance)['is_hr']
 
     def get_is_head_hr(self, instance):
-        return instance.has_perm('users.is_head_hr')
+        return self.get_roles(instance)['is_head_hr']
 
 
 class UserEmployeeInfoSerializer(serializers.ModelSerializer):
@@ -0,0 +1,49 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from company.models import Unit
+from users.models import User
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles_on_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает роли пользователей при изменении их прав и групп."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        User.invalidate_roles(instance.pk)
+    elif pk_set:
+        User.invalidate_roles(*pk_set)
+    else:
+        User.invalidate_all_roles()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_user_roles_on_group_permissions(sender, action, **kwargs):
+    """Сбрасывает роли всех пользователей при изменении прав групп."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        User.invalidate_all_roles()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_roles_on_save(sender, instance, **kwargs):
+    """Роли зависят от is_active и is_superuser."""
+    User.invalidate_roles(instance.pk)
+
+
+@receiver(pre_save, sender=Unit)
+def remember_unit_manager(sender, instance, **kwargs):
+    instance._previous_manager_id = (
+        Unit.objects.filter(pk=instance.pk).values_list('manager_id', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def invalidate_user_roles_on_unit_manager(sender, instance, **kwargs):
+    """Сбрасывает роли прежнего и нового руководителя подразделения."""
+    previous_manager_id = getattr(instance, '_previous_manager_id', None)
+    if previous_manager_id != instance.manager_id or kwargs.get('signal') is post_delete:
+        User.invalidate_roles(previous_manager_id, instance.manager_id)
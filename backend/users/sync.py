@@ -0,0 +1,254 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from company.models import City, Position, Unit
+from core.clients import get_employee_client
+from users.serializers import UserEmployeeOdataSerializer, UserEmployeeSerializer
+
+UserModel = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+class EmployeeSync:
+    """Загрузка изменений пользователей из employee.
+    Страницы employees/odata_v2 загружаются параллельно с обработкой предыдущей страницы,
+    данные сотрудников и наличие фото запрашиваются конкурентно (не более USERS_SYNC_CONCURRENCY запросов),
+    пользователи сохраняются пачками. После каждой страницы сохраняется чекпоинт,
+    прерванная загрузка продолжается с последней сохраненной страницы.
+    """
+
+    def __init__(self):
+        self.filter = settings.USERS_EMPLOYEE_FILTER
+        self.top = settings.EMPLOYEE_CHUNK_SIZE
+        self.error_count = 0
+        checkpoint = cache.get(settings.USERS_SYNC_CHECKPOINT_CACHE_KEY)
+        if checkpoint:
+            logger.info(f'Продолжаем загрузку пользователей со страницы skip={checkpoint["skip"]}.')
+            self.skip = checkpoint['skip']
+            self.last_update = checkpoint['last_update']
+            self.new_last_update = checkpoint['new_last_update']
+            self.not_fired_users_personnel_numbers = checkpoint['not_fired_users_personnel_numbers']
+        else:
+            self.skip = 0
+            self.last_update = cache.get(settings.USERS_LAST_UPDATE_CACHE_KEY)
+            self.new_last_update = timezone.now().date()
+            self.not_fired_users_personnel_numbers = []
+
+    def save_checkpoint(self):
+        cache.set(settings.USERS_SYNC_CHECKPOINT_CACHE_KEY, {
+            'skip': self.skip,
+            'last_update': self.last_update,
+            'new_last_update': self.new_last_update,
+            'not_fired_users_personnel_numbers': self.not_fired_users_personnel_numbers,
+        }, timeout=settings.USERS_SYNC_CHECKPOINT_TIMEOUT)
+
+    async def run(self):
+        self.semaphore = asyncio.Semaphore(settings.USERS_SYNC_CONCURRENCY)
+        # Следующая страница загружается, пока обрабатывается текущая
+        pages = asyncio.Queue(maxsize=1)
+        async with httpx.AsyncClient(verify=False) as self.image_client:
+            producer = asyncio.create_task(self.fetch_pages(pages))
+            try:
+                while True:
+                    skip, page = await pages.get()
+                    if isinstance(page, Exception):
+                        raise page
+                    if page is None:
+                        break
+                    await self.process_page(page)
+                    self.skip = skip + self.top
+                    await sync_to_async(self.save_checkpoint)()
+            finally:
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+        cache.delete(settings.USERS_SYNC_CHECKPOINT_CACHE_KEY)
+
+    async def fetch_pages(self, pages: asyncio.Queue):
+        """Кладет в очередь страницы (skip, данные), в конце - (skip, None).
+        Ошибка загрузки передается через очередь, чтобы прервать обработку.
+        """
+        skip = self.skip
+        while True:
+            data = await asyncio.to_thread(
+                get_employee_client().get,
+                url='employees/odata_v2', params={'filter': self.filter, 'top': self.top, 'skip': skip}
+            )
+            if data is None:
+                await pages.put((skip, Exception(
+                    'Не удалось получить данные об изменениях пользователей с employee.'
+                    f'Праметры: url: employees/odata_v2, filter: {self.filter}, top: {self.top}, skip: {skip}.'
+                )))
+                return
+            if not data.get('data'):
+                await pages.put((skip, None))
+                return
+            await pages.put((skip, data['data']))
+            skip += self.top
+
+    async def process_page(self, page: List[dict]):
+        personnel_numbers = []
+        for employee_data in page:
+            serializer_odata = UserEmployeeOdataSerializer(data=employee_data)
+            if serializer_odata.is_valid():
+                personnel_number = serializer_odata.validated_data['personnel_number']
+                updated_at = serializer_odata.validated_data['updated_at']
+                self.not_fired_users_personnel_numbers.append(personnel_number)
+                if not self.last_update or updated_at >= self.last_update:
+                    personnel_numbers.append(personnel_number)
+            else:
+                self.error_count += 1
+                if self.error_count >= settings.USER_LOAD_MAX_ERROR:
+                    raise Exception(
+                        f'Получено {self.error_count} ошибок подряд, что превышает максимальное число ошибок.'
+                    )
+        results = await asyncio.gather(*(self.fetch_employee(personnel_number) for personnel_number in personnel_numbers))
+        users_data = []
+        # Ответы разбираем по порядку, чтобы считать пустые ответы подряд
+        for personnel_number, data in zip(personnel_numbers, results):
+            if data is None:
+                logger.info(f'На запрос данных о {personnel_number} получен пустой ответ.')
+                self.error_count += 1
+                if self.error_count >= settings.USER_LOAD_MAX_ERROR:
+                    raise Exception(f'Получен {self.error_count} раз подряд пустой ответ.')
+            elif data.get('data'):
+                self.error_count = 0
+                serializer = UserEmployeeSerializer(data=data.get('data'))
+                if serializer.is_valid():
+                    users_data.append(serializer.validated_data)
+                else:
+                    logger.info(
+                        f'Данные по пользователю {personnel_number} не прошли валидацию. Ошибка: {serializer.errors}'
+                    )
+        images_exist = await asyncio.gather(*(self.is_image_exists(data.get('image_url')) for data in users_data))
+        for data, image_exists in zip(users_data, images_exist):
+            data['image_url'] = data.get('image_url') if image_exists else None
+        await sync_to_async(self.save_users)(users_data)
+
+    async def fetch_employee(self, personnel_number: str) -> Optional[dict]:
+        async with self.semaphore:
+            return await asyncio.to_thread(get_employee_client().get, url='employee', params={'pn': personnel_number})
+
+    async def is_image_exists(self, employee_image_url: Optional[str]) -> bool:
+        """Проверяет существование фото пользователя.
+        Сейчас фото пользователей хранятся на разных хостах для dev и prod сервиса emply.
+        Если у пользователя нет фото - код ошибки:
+        https://dm.msk-cicd-s3.megafon.ru (dev) - 403
+        https://cdn.meganet.megafon.ru (prod) - 404
+        """
+        if not employee_image_url:
+            return False
+        async with self.semaphore:
+            try:
+                response = await self.image_client.get(url=employee_image_url)
+            except Exception as e:
+                logger.error(f'Request error for image check for url {employee_image_url}: {e}')
+                return False
+        if response.status_code == 200:
+            return True
+        if response.status_code in (403, 404):
+            logger.info(f'Image not found for url {employee_image_url}.')
+        return False
+
+    def save_users(self, users_data: List[dict]):
+        """Сохраняет пользователей страницы пачками.
+        Подразделения, должности, города и руководители создаются так же, как в UserEmployeeSerializer.prepare_data,
+        но одним запросом на страницу.
+        """
+        users_data = {data['personnel_number']: data for data in users_data}
+        units = self.get_units(users_data.values())
+        positions = self.get_positions(users_data.values(), units)
+        cities = self.get_cities(users_data.values())
+        managers = self.get_managers(users_data.values())
+
+        prepared = {}
+        for personnel_number, data in users_data.items():
+            data = data.copy()
+            data.pop('personnel_number')
+            data.pop('unit', None)
+            unit_id = data.pop('unit_id', None)
+            data.pop('position', None)
+            position_id = data.pop('position_id', None)
+            city = data.pop('city', None)
+            manager = data.pop('manager', None)
+            data['is_active'] = not data.pop('is_disable', True)
+            if unit_id:
+                data['unit'] = units[unit_id]
+                if position_id:
+                    data['position'] = positions[position_id]
+            if city:
+                data['city'] = cities[city]
+            if manager:
+                data['manager'] = managers[manager['personnel_number']]
+            prepared[personnel_number] = data
+
+        now = timezone.now()
+        existing = UserModel.objects.in_bulk(list(prepared), field_name='personnel_number')
+        update_fields = {'modified'}
+        for personnel_number, user in existing.items():
+            data = prepared.pop(personnel_number)
+            for field, value in data.items():
+                setattr(user, field, value)
+            user.modified = now
+            update_fields.update(data)
+        UserModel.objects.bulk_update(
+            existing.values(), fields=list(update_fields), batch_size=settings.USERS_SYNC_BATCH_SIZE
+        )
+        UserModel.objects.bulk_create(
+            [UserModel(personnel_number=personnel_number, **data) for personnel_number, data in prepared.items()],
+            batch_size=settings.USERS_SYNC_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        UserModel.invalidate_employee_cache(*users_data)
+        # bulk_update не отправляет сигналы, а роли зависят от is_active
+        UserModel.invalidate_roles(*(user.pk for user in existing.values()))
+
+    @staticmethod
+    def get_units(users_data) -> Dict[str, Unit]:
+        unit_names = {data['unit_id']: data.get('unit') for data in users_data if data.get('unit_id')}
+        units = Unit.objects.in_bulk(list(unit_names), field_name='code')
+        # Новые подразделения создаются по одному, тк bulk_create не заполняет поля дерева
+        for code in unit_names.keys() - units.keys():
+            units[code], _ = Unit.objects.get_or_create(code=code, defaults={'name': unit_names[code]})
+        return units
+
+    @staticmethod
+    def get_positions(users_data, units: Dict[str, Unit]) -> Dict[str, Position]:
+        new_positions = {
+            data['position_id']: Position(code=data['position_id'], unit=units[data['unit_id']], name=data.get('position'))
+            for data in users_data if data.get('unit_id') and data.get('position_id')
+        }
+        positions = Position.objects.in_bulk(list(new_positions), field_name='code')
+        if new_positions.keys() - positions.keys():
+            Position.objects.bulk_create(
+                [new_positions[code] for code in new_positions.keys() - positions.keys()], ignore_conflicts=True
+            )
+            positions = Position.objects.in_bulk(list(new_positions), field_name='code')
+        return positions
+
+    @staticmethod
+    def get_cities(users_data) -> Dict[str, City]:
+        names = {data['city'] for data in users_data if data.get('city')}
+        cities = City.objects.in_bulk(list(names), field_name='name')
+        if names - cities.keys():
+            City.objects.bulk_create([City(name=name) for name in names - cities.keys()], ignore_conflicts=True)
+            cities = City.objects.in_bulk(list(names), field_name='name')
+        return cities
+
+    @staticmethod
+    def get_managers(users_data) -> Dict[str, UserModel]:
+        personnel_numbers = {data['manager']['personnel_number'] for data in users_data if data.get('manager')}
+        managers = UserModel.objects.in_bulk(list(personnel_numbers), field_name='personnel_number')
+        if personnel_numbers - managers.keys():
+            UserModel.objects.bulk_create(
+                [UserModel(personnel_number=pn) for pn in personnel_numbers - managers.keys()], ignore_conflicts=True
+            )
+            managers = UserModel.objects.in_bulk(list(personnel_numbers), field_name='personnel_number')
+        return managers
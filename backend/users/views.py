@@ -27,10 +27,10 @@ class UsersListView(generics.ListAPIView):
         unit_code = query_serializer.validated_data.get('unit_code')
         if query_serializer.validated_data['is_recruiter']:
             perm = Permission.objects.get(codename='is_hr')
-            return User.objects.filter(Q(groups__permissions=perm) | Q(user_permissions=perm)).distinct()
+            return User.objects.filter(Q(groups__permissions=perm) | Q(user_permissions=perm)).with_roles().distinct()
         if not unit_code:
             logger.info('unit_code not provided - returning all users')
-            return User.objects.all()
+            return User.objects.with_roles()
         unit = Unit.objects.filter(code=unit_code).first()
         if not unit:
             logger.info(f'Unit with code={unit_code} not found, returning empty queryset')
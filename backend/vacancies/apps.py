@@ -5,3 +5,6 @@ class VacanciesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vacancies'
     verbose_name = 'Вакансии'
+
+    def ready(self):
+        import vacancies.signals  # noqa: F401
@@ -58,3 +58,11 @@ ROLE_TO_VACANCY_FILTERS = {
     VacancyRoleChoices.HR: VacancyStatusChoices.values,
     VacancyRoleChoices.HEAD_HR: VacancyStatusChoices.values
 }
+
+
+class VacancySearchWeights:
+    """Части поискового вектора вакансии, по которым идет поиск.
+    A - название, B - подразделение и руководитель, C - задачи и ожидания, D - рекрутер.
+    """
+    PUBLIC = 'ABC'
+    RECRUITER = 'AD'
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Поисковый вектор вакансии:
+# A - название, B - подразделение и руководитель, C - задачи и ожидания, D - рекрутер.
+# Конфигурация должна совпадать с vacancies.models.VACANCY_SEARCH_CONFIG
+CREATE_TRIGGERS_SQL = """
+CREATE FUNCTION vacancies_vacancy_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(
+            (SELECT name FROM company_unit WHERE id = NEW.unit_id), ''
+        )), 'B')
+        || setweight(to_tsvector('russian', coalesce(
+            (SELECT first_name || ' ' || last_name FROM users_user WHERE id = NEW.manager_id), ''
+        )), 'B')
+        || setweight(to_tsvector('russian', coalesce(NEW.duties, '') || ' ' || coalesce(NEW.skills, '')), 'C')
+        || setweight(to_tsvector('russian', coalesce(
+            (SELECT first_name || ' ' || last_name FROM users_user WHERE id = NEW.recruiter_id), ''
+        )), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER vacancies_vacancy_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, duties, skills, unit_id, manager_id, recruiter_id
+    ON vacancies_vacancy
+    FOR EACH ROW EXECUTE PROCEDURE vacancies_vacancy_search_vector_update();
+
+-- Переименование подразделения или сотрудника пересчитывает вектор связанных вакансий
+CREATE FUNCTION vacancies_unit_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE vacancies_vacancy SET unit_id = unit_id WHERE unit_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER vacancies_unit_search_vector_trigger
+    AFTER UPDATE OF name ON company_unit
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE vacancies_unit_search_vector_update();
+
+CREATE FUNCTION vacancies_user_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE vacancies_vacancy SET manager_id = manager_id WHERE manager_id = NEW.id OR recruiter_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER vacancies_user_search_vector_trigger
+    AFTER UPDATE OF first_name, last_name ON users_user
+    FOR EACH ROW WHEN (OLD.first_name IS DISTINCT FROM NEW.first_name OR OLD.last_name IS DISTINCT FROM NEW.last_name)
+    EXECUTE PROCEDURE vacancies_user_search_vector_update();
+
+UPDATE vacancies_vacancy SET title = title;
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER vacancies_user_search_vector_trigger ON users_user;
+DROP FUNCTION vacancies_user_search_vector_update();
+DROP TRIGGER vacancies_unit_search_vector_trigger ON company_unit;
+DROP FUNCTION vacancies_unit_search_vector_update();
+DROP TRIGGER vacancies_vacancy_search_vector_trigger ON vacancies_vacancy;
+DROP FUNCTION vacancies_vacancy_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0010_branch_company_to_office'),
+        ('users', '0012_user_custom_image_url'),
+        ('vacancies', '0024_auto_20231206_1004'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='vacancy',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='vacancy_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='vacancy_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, reverse_sql=DROP_TRIGGERS_SQL),
+    ]
@@ -1,27 +1,113 @@
 import logging
+import re
 from datetime import date
+from typing import Dict, List, Optional
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+    TrigramSimilarity
+)
 from django.core import validators
-from django.db import models
-from django.db.models import Q
-from django.db.models.functions import Now
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, FloatField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Cast, Coalesce, Now
 from django.utils import timezone
 from mdeditor.fields import MDTextField
 
-from app.models import TimestampedModel
+from app.models import DefaultManager, DefaultQueryset, TimestampedModel
 from company.enums import SelectionTypeChoices
-from company.models import Position
-from core.utils import file_path
+from company.models import Position, Unit
+from company.tree import UnitTree
+from core.enums import CAREER_TYPE_MAP
+from core.utils import bump_cache_version, file_path, get_cache_version, get_random_sample
 from replies.enums import ReplyStatusChoices, StepStateChoices
-from replies.models import Step
+from replies.models import Reply, Step
 from users.models import User
-from vacancies.enums import QuestionType, VacancyStatusChoices, VacancyTypeChoices
+from vacancies.enums import (
+    QuestionType,
+    VacancySearchWeights,
+    VacancyStatusChoices,
+    VacancyTypeChoices
+)
 
 logger = logging.getLogger(__name__)
 
+VACANCY_ELIGIBILITY_VERSION_KEY = 'vacancy_eligibility_version'
+VACANCY_COUNTERS_VERSION_KEY = 'vacancy_counters_version'
+FACTOID_IDS_CACHE_KEY = 'factoid_ids'
+# Конфигурация полнотекстового поиска, должна совпадать с триггером из миграции 0025_vacancy_search_vector
+VACANCY_SEARCH_CONFIG = 'russian'
+
+
+class VacancyQuerySet(DefaultQueryset):
+    def with_detail_relations(self):
+        """Связанные данные для подробного описания вакансии (VacancySerializer).
+        office_links - связи с офисами (с признаком главного офиса) вместе с офисами и городами.
+        """
+        return self.select_related(
+            'unit', 'manager__position', 'position__unit', 'rate', 'recruiter__position',
+            'vacancy_type', 'reason', 'work_experience', 'work_contract'
+        ).prefetch_related(
+            Prefetch(
+                'vacancytooffice_set',
+                queryset=VacancyToOffice.objects.select_related('office__city').order_by('id'),
+                to_attr='office_links',
+            ),
+            'images',
+        )
+
+    def with_replies_count(self):
+        """Добавляет количество откликов на вакансию подзапросом (без join-а откликов в основной запрос)."""
+        replies_count = Reply.objects.filter(
+            vacancy=OuterRef('pk')
+        ).order_by().values('vacancy').annotate(total=Count('id')).values('total')
+        return self.annotate(replies_count=Coalesce(Subquery(replies_count), 0))
+
+    def with_user_reply(self, user: User):
+        """Добавляет данные пользователя по вакансии:
+        is_restricted - завален тест (вакансия недоступна для отклика),
+        user_reply_id, user_reply_created - отклик пользователя на вакансию.
+        """
+        user_reply = Reply.objects.filter(vacancy=OuterRef('pk'), user=user)
+        return self.annotate(
+            is_restricted=Exists(Restrict.objects.filter(vacancy=OuterRef('pk'), user=user)),
+            user_reply_id=Subquery(user_reply.values('id')[:1]),
+            user_reply_created=Subquery(user_reply.values('created')[:1]),
+        )
+
+    def search(self, query: str, weights: str = VacancySearchWeights.PUBLIC):
+        """Полнотекстовый поиск по search_vector с сортировкой по релевантности (аннотация search_rank).
+        weights - части вектора, по которым идет поиск (см. VacancySearchWeights).
+        Если по словам ничего не нашлось (например, из-за опечатки), ищет по похожести названия.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return self
+        # Префиксный поиск по каждому слову, тк запрос отправляется на каждое нажатие клавиши
+        search_query = SearchQuery(
+            ' & '.join(f"'{word}':*{weights}" for word in words), config=VACANCY_SEARCH_CONFIG, search_type='raw'
+        )
+        queryset = self.filter(search_vector=search_query)
+        # Ранг приводится к double precision: значение real из курсора (float) не равно самому себе в базе,
+        # и при постраничном выводе строки с одинаковым рангом пропускались бы
+        if queryset.exists():
+            return queryset.annotate(search_rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()))
+        return self.filter(title__trigram_similar=query).annotate(
+            search_rank=Cast(TrigramSimilarity('title', query), FloatField())
+        )
+
 
 class Vacancy(TimestampedModel):
+    # Поля, от которых зависит индекс доступности (см. get_eligibility_index), статус - последним
+    ELIGIBILITY_FIELDS = ('position_id', 'unit_id', 'status')
+
+    objects = DefaultManager.from_queryset(VacancyQuerySet)()
+
     title = models.CharField(
         verbose_name='Название вакансии',
         max_length=512
@@ -195,6 +281,13 @@ class Vacancy(TimestampedModel):
         default=SelectionTypeChoices.PROFESSIONAL,
         max_length=217
     )
+    # Заполняется триггером в БД (см. миграцию 0025_vacancy_search_vector)
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        editable=False,
+        blank=True,
+        null=True,
+    )
 
     # Период отображения вакансии на сервисе - 4 недели.
     # По истечении 4-х недель вакансия закрывается без возможности переоткрытия.
@@ -203,16 +296,63 @@ class Vacancy(TimestampedModel):
     class Meta:
         verbose_name = 'Вакансия'
         verbose_name_plural = 'Вакансии'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='vacancy_search_vector_idx'),
+            GinIndex(fields=['title'], name='vacancy_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f'Вакансия {self.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения ELIGIBILITY_FIELDS при загрузке: сигналы сравнивают с ними без дополнительного запроса
+        if all(field in instance.__dict__ for field in cls.ELIGIBILITY_FIELDS):
+            instance._loaded_eligibility_fields = tuple(instance.__dict__[field] for field in cls.ELIGIBILITY_FIELDS)
+        return instance
+
     @staticmethod
     def get_q_for_vacancy_type(type: VacancyTypeChoices, user: User) -> Q:
+        """Фильтр вакансий для вкладок доступные/на вырост/другие направления.
+        Вакансии берутся из индекса доступности (см. get_eligibility_index), поэтому фильтр - выборка по id.
+        """
+        index = Vacancy.get_eligibility_index(user)
+        if index is None:
+            return Q(position=None)
+        if type in index:
+            return Q(id__in=index[type])
+        # Без типа - все вакансии в целевых должностях
+        return Q(id__in=[vacancy_id for vacancy_ids in index.values() for vacancy_id in vacancy_ids])
+
+    @staticmethod
+    def get_eligibility_index(user: User) -> Optional[Dict[str, List[int]]]:
+        """Индекс доступности опубликованных вакансий: {тип вакансий: [id вакансий]}.
+        Зависит только от должности и направления пользователя, поэтому хранится в кэше по паре
+        (должность, направление). Сбрасывается сменой версии при изменении ELIGIBILITY_FIELDS
+        опубликованных вакансий, должностей, целевых должностей и структуры подразделений (см. vacancies.signals).
+        """
+        department = user.department
+        key = 'vacancy_eligibility:{version}:{position_id}:{department_id}'.format(
+            version=get_cache_version(VACANCY_ELIGIBILITY_VERSION_KEY),
+            position_id=user.position_id,
+            department_id=department.id if department else None,
+        )
+        index = cache.get(key)
+        if index is None:
+            index = Vacancy.build_eligibility_index(user)
+            # Отсутствие должности кэшируем отдельным значением, тк None - признак отсутствия ключа
+            cache.set(key, index if index is not None else {}, timeout=settings.VACANCY_ELIGIBILITY_TIMEOUT)
+        return index or None
 
+    @staticmethod
+    def build_eligibility_index(user: User) -> Optional[Dict[str, List[int]]]:
+        """Собирает индекс доступности вакансий для пользователя.
+        Возвращает None, если текущая должность пользователя не найдена.
+        """
         current_position = Position.objects.filter(name=user.position).first()
         if not current_position:
-            return Q(position=None)
+            return None
         target_positions = current_position.targets.all()
         target_positions_levels = [position.level for position in target_positions]
         levels_dict = Position.get_levels_dict(target_positions_levels)
@@ -229,23 +369,77 @@ class Vacancy(TimestampedModel):
         # Добавляем текущий уровень, тк мб переход вида П3 -> П3
         available_positions_levels.append(current_position.level)
         q = Q(position__in=target_positions)
-        if type == VacancyTypeChoices.AVAILABLE:
-            q &= (
-                Q(position__level__in=available_positions_levels)
-                & Q(unit__in=user.department.get_descendants())
-            )
-        if type == VacancyTypeChoices.GROWTH:
-            q &= (
-                ~Q(position__level__in=available_positions_levels)
-                & Q(unit__in=user.department.get_descendants())
-            )
-        if type == VacancyTypeChoices.OTHER:
+        department_units = UnitTree.get().get_descendant_ids(user.department.id)
+        type_to_q = {
+            VacancyTypeChoices.AVAILABLE: (
+                q & Q(position__level__in=available_positions_levels) & Q(unit__in=department_units)
+            ),
+            VacancyTypeChoices.GROWTH: (
+                q & ~Q(position__level__in=available_positions_levels) & Q(unit__in=department_units)
+            ),
             # Получаем направления, отличные от направления пользователя
             # Вакансии для других направлений определяются маршрутом перемещения по должностям из файла,
             # те вакансия в другом направлении должна быть в целевой должности для текущей должности пользователя
             # без градации по уровню.
-            q &= ~Q(unit__in=user.department.get_descendants())
-        return q
+            VacancyTypeChoices.OTHER: q & ~Q(unit__in=department_units),
+        }
+        published = Vacancy.objects.filter(status=VacancyStatusChoices.PUBLISHED)
+        return {
+            type.value: list(published.filter(type_q).values_list('id', flat=True))
+            for type, type_q in type_to_q.items()
+        }
+
+    @staticmethod
+    def invalidate_eligibility_index():
+        # После коммита, чтобы индекс не пересобрался по незакоммиченным данным под новой версией
+        transaction.on_commit(lambda: bump_cache_version(VACANCY_ELIGIBILITY_VERSION_KEY))
+
+    @staticmethod
+    def get_published_counters() -> Dict[str, Dict[int, Dict[str, int]]]:
+        """Счетчики опубликованных вакансий:
+        {'units': {id подразделения: счетчик}, 'cities': {id города: счетчик}},
+        счетчик - {'total': всего, тип карьеры: количество}. Для подразделения учитываются вакансии всего поддерева.
+        Хранятся в кэше, сбрасываются сменой версии после коммита транзакции, изменившей вакансии (см. vacancies.signals).
+        """
+        key = f'vacancy_counters:{get_cache_version(VACANCY_COUNTERS_VERSION_KEY)}'
+        counters = cache.get(key)
+        if counters is None:
+            counters = Vacancy.build_published_counters()
+            cache.set(key, counters, timeout=settings.VACANCY_COUNTERS_TIMEOUT)
+        return counters
+
+    @staticmethod
+    def build_published_counters() -> Dict[str, Dict[int, Dict[str, int]]]:
+        """Считает счетчики опубликованных вакансий за три запроса."""
+        def increment(counter: Dict[str, int], level: Optional[str]):
+            counter['total'] = counter.get('total', 0) + 1
+            for career, level_code in CAREER_TYPE_MAP.items():
+                if level_code in (level or ''):
+                    counter[career] = counter.get(career, 0) + 1
+
+        published = Vacancy.objects.filter(
+            status=VacancyStatusChoices.PUBLISHED
+        ).values_list('id', 'unit_id', 'position__level')
+        unit_parents = dict(Unit.objects.values_list('id', 'parent_id'))
+        vacancy_levels = {}
+        units, cities = {}, {}
+        for vacancy_id, unit_id, level in published:
+            vacancy_levels[vacancy_id] = level
+            # Вакансия учитывается в подразделении и во всех его родителях
+            while unit_id is not None:
+                increment(units.setdefault(unit_id, {}), level)
+                unit_id = unit_parents.get(unit_id)
+        city_vacancies = VacancyToOffice.objects.filter(
+            vacancy__status=VacancyStatusChoices.PUBLISHED
+        ).values_list('vacancy_id', 'office__city_id').distinct()
+        for vacancy_id, city_id in city_vacancies:
+            increment(cities.setdefault(city_id, {}), vacancy_levels.get(vacancy_id))
+        return {'units': units, 'cities': cities}
+
+    @staticmethod
+    def invalidate_published_counters():
+        # Сбрасываем после коммита, чтобы счетчики не пересчитались по незакоммиченным данным
+        transaction.on_commit(lambda: bump_cache_version(VACANCY_COUNTERS_VERSION_KEY))
 
     def close(self):
         """
@@ -581,6 +775,15 @@ class Factoid(models.Model):
     def __str__(self):
         return self.file.name
 
+    @staticmethod
+    def get_random(limit: int) -> List['Factoid']:
+        """Случайные фактоиды. Список id хранится в кэше и сбрасывается при изменении фактоидов (см. vacancies.signals)."""
+        return get_random_sample(Factoid.objects.all(), limit, ids_cache_key=FACTOID_IDS_CACHE_KEY)
+
+    @staticmethod
+    def invalidate_ids():
+        transaction.on_commit(lambda: cache.delete(FACTOID_IDS_CACHE_KEY))
+
 
 class Rate(models.Model):
     title = models.CharField('Уровень вакансии', max_length=20, unique=True)
@@ -5,8 +5,9 @@ from django.db import transaction
 from rest_framework import serializers
 
 from app import errors
+from app.pagination import invalidate_pagination_counts
 from company.enums import SelectionTypeChoices
-from company.models import City, Office, Position, Unit
+from company.models import Office, Position, Unit
 from company.serializers import (
     CitySerializer,
     OfficeInVacancyDescriptionSerializer,
@@ -14,7 +15,8 @@ from company.serializers import (
     UnitSerializer
 )
 from replies.models import Reply
-from sap.tasks import send_extension_vacancy_publication, send_vacancy_to_sap
+from sap.enum import SapOutboxMessageType
+from sap.models import SapOutbox
 from users.models import User
 from users.serializers import UserReplyAvatarSerializer
 from vacancies.enums import VacancyOwnerChoices, VacancyStateChoices, VacancyStatusChoices
@@ -80,13 +82,14 @@ class RateSerializer(serializers.ModelSerializer):
 
 
 class VacancyShortSerializer(serializers.ModelSerializer):
+    """Ожидает queryset с аннотациями VacancyQuerySet.with_replies_count и VacancyQuerySet.with_user_reply."""
     company_unit_name = serializers.CharField(source='unit.name', allow_null=True)
     manager = UserReplyAvatarSerializer()
     state = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField()
     reply = serializers.SerializerMethodField()
     rate = serializers.SlugRelatedField(slug_field='title', read_only=True)
-    replies_count = serializers.IntegerField(source='replies.count')
+    replies_count = serializers.IntegerField()  # Аннотировано.
 
     class Meta:
         model = Vacancy
@@ -100,9 +103,9 @@ class VacancyShortSerializer(serializers.ModelSerializer):
         user = self.context.get('request').user
         if str(user.top_performer_rate) > str(instance.rate) or not user.top_performer_rate:
             return VacancyStateChoices.RATE_MISMATCH.slug_name_dict
-        if user.restrictions.filter(vacancy=instance).exists():  # Завален тест
+        if instance.is_restricted:  # Завален тест
             return VacancyStateChoices.TEST_FAILED.slug_name_dict
-        if user.replies.filter(vacancy=instance).exists():  # Уже откликался
+        if instance.user_reply_id:  # Уже откликался
             return VacancyStateChoices.REPLIED.slug_name_dict
 
         return VacancyStateChoices.REPLY.slug_name_dict
@@ -111,11 +114,14 @@ class VacancyShortSerializer(serializers.ModelSerializer):
         return VacancyStatusChoices(instance.status).slug_name_dict
 
     def get_reply(self, instance):
-        reply = instance.replies.filter(user=self.context['request'].user).first()
-        return VacancyReplyShortSerializer(reply).data if reply else None
+        if not instance.user_reply_id:
+            return None
+        reply = Reply(id=instance.user_reply_id, created=instance.user_reply_created)
+        return VacancyReplyShortSerializer(reply).data
 
 
 class VacancySerializer(VacancyShortSerializer):
+    """Ожидает queryset с VacancyQuerySet.with_detail_relations (и аннотациями VacancyShortSerializer)."""
     company_units_chain = UnitSerializer(source='unit.chain', many=True)
     images = serializers.SerializerMethodField()
     user_rate = serializers.SerializerMethodField()
@@ -149,12 +155,15 @@ class VacancySerializer(VacancyShortSerializer):
         return self.context.get('request').user.top_performer_rate
 
     def get_offices(self, instance):
-        return OfficeInVacancyDescriptionSerializer(instance.offices, context={'vacancy': instance}, many=True).data
+        offices = []
+        for link in instance.office_links:
+            link.office.is_main = link.is_main
+            offices.append(link.office)
+        return OfficeInVacancyDescriptionSerializer(offices, many=True).data
 
     def get_cities(self, instance):
-        offices = instance.offices.all()
-        cities = City.objects.filter(offices__in=offices).distinct()
-        return CitySerializer(cities, many=True).data
+        cities = {link.office.city_id: link.office.city for link in instance.office_links}
+        return CitySerializer(cities.values(), many=True).data
 
 
 class VacancyShortReplySerializer(serializers.ModelSerializer):
@@ -213,6 +222,7 @@ class VacancyCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(detail=errors.MAIN_OFFICE_REQUIRED)
         return offices_data
 
+    @transaction.atomic
     def create(self, validated_data):
         publisher = self.context.user
         offices_data = validated_data.pop('offices')
@@ -246,7 +256,7 @@ class VacancyCreateUpdateSerializer(serializers.ModelSerializer):
         # Если тест не обнаружится, будет отправлено уведомление на email администраторов.
         # send_email_vacancy_without_test.apply_async((vacancy.id, ), countdown=settings.VACANCY_WITHOUT_TEST_DELAY)
         if vacancy.selection_type == SelectionTypeChoices.PROFESSIONAL:
-            send_vacancy_to_sap.delay(vacancy.id)
+            SapOutbox.enqueue(SapOutboxMessageType.VACANCY, vacancy.id, vacancy_id=vacancy.id)
         return vacancy
 
     def update(self, instance: Vacancy, validated_data):
@@ -272,8 +282,8 @@ class VacancyCreateUpdateSerializer(serializers.ModelSerializer):
                 ]
                 VacancyToOffice.objects.bulk_create(new_offices)  # Создаем связку с новыми офисами
             super().update(instance, validated_data)
-        if end_date:
-            send_extension_vacancy_publication.delay(instance.id)
+            if end_date:
+                SapOutbox.enqueue(SapOutboxMessageType.VACANCY_EXTENSION, instance.id, vacancy_id=instance.id)
         return instance
 
 
@@ -309,7 +319,7 @@ class VacancyDetailRecruiterUpdateSerializer(VacancyStatusUpdateSerializer):
         fields = ('status', 'recruiter_personnel_number')
 
     def validate_recruiter_personnel_number(self, value):
-        if not value.has_perm('users.is_hr'):
+        if not value.roles['is_hr']:
             raise serializers.ValidationError(detail=errors.RECRUITER_ROLE_REQUIRED)
         return value
 
@@ -475,7 +485,7 @@ class VacancyQueryParamSerializer(serializers.Serializer):
     selection_type = serializers.ChoiceField(choices=SelectionTypeChoices.choices, required=False)
 
     def validate_recruiter_personnel_number(self, value):
-        if not value.has_perm('users.is_hr'):
+        if not value.roles['is_hr']:
             raise serializers.ValidationError(detail=errors.RECRUITER_ROLE_REQUIRED)
         return value
 
@@ -495,13 +505,14 @@ class VacancyPatchRecruiterSerializer(serializers.Serializer):
         fields = ('vacancies_ids', 'recruiter_personnel_number')
 
     def validate_recruiter_personnel_number(self, value):
-        if not value.has_perm('users.is_hr'):
+        if not value.roles['is_hr']:
             raise serializers.ValidationError(detail=errors.RECRUITER_ROLE_REQUIRED)
         return value
 
     def save(self, **kwargs):
         user = self.context.get('request').user
         manager_perm = Permission.objects.get(codename='is_manager')
+        published = False
         with transaction.atomic():
             for vacancy in self.validated_data['vacancies']:
                 if vacancy.status == VacancyStatusChoices.CLOSED:
@@ -509,7 +520,13 @@ class VacancyPatchRecruiterSerializer(serializers.Serializer):
                 vacancy.recruiter = self.validated_data['recruiter']
                 if vacancy.status == VacancyStatusChoices.MODERATION:
                     vacancy.status = VacancyStatusChoices.PUBLISHED
+                    published = True
                 vacancy.manager.user_permissions.add(manager_perm)
                 VacancyViewed.objects.get_or_create(user=user, vacancy=vacancy)
             Vacancy.objects.bulk_update(self.validated_data['vacancies'], fields=['recruiter', 'status'])
+        # bulk_update не отправляет сигналы
+        if published:
+            Vacancy.invalidate_eligibility_index()
+        Vacancy.invalidate_published_counters()
+        invalidate_pagination_counts()
         return
@@ -0,0 +1,67 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from app.pagination import invalidate_pagination_counts
+from company.models import Position, PositionToTargetPosition, Unit
+from vacancies.enums import VacancyStatusChoices
+from vacancies.models import Factoid, Vacancy, VacancyToOffice
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+def invalidate_vacancy_eligibility_index_on_vacancy(sender, instance, **kwargs):
+    """Индекс хранит только опубликованные вакансии, поэтому сбрасывается,
+    только если у опубликованной (до или после сохранения) вакансии изменились должность, подразделение или статус.
+    Прежние значения - загруженные из базы (Vacancy.from_db), если их нет - индекс сбрасывается.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'position', 'position_id', 'unit', 'unit_id', 'status'} & set(update_fields):
+        return
+    current = tuple(getattr(instance, field) for field in Vacancy.ELIGIBILITY_FIELDS)
+    if kwargs.get('signal') is post_delete:
+        previous, current = current, None
+    elif kwargs.get('created'):
+        previous = None
+    elif hasattr(instance, '_loaded_eligibility_fields'):
+        previous = instance._loaded_eligibility_fields
+    else:
+        Vacancy.invalidate_eligibility_index()
+        return
+    if current:
+        instance._loaded_eligibility_fields = current
+    if previous == current:
+        return
+    published = VacancyStatusChoices.PUBLISHED
+    if (previous and previous[-1] == published) or (current and current[-1] == published):
+        Vacancy.invalidate_eligibility_index()
+
+
+@receiver([post_save, post_delete], sender=Position)
+@receiver([post_save, post_delete], sender=PositionToTargetPosition)
+@receiver([post_save, post_delete], sender=Unit)
+def invalidate_vacancy_eligibility_index(sender, **kwargs):
+    """Сбрасывает индекс доступности вакансий при изменении данных, от которых он зависит."""
+    Vacancy.invalidate_eligibility_index()
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+@receiver([post_save, post_delete], sender=VacancyToOffice)
+@receiver(m2m_changed, sender=Vacancy.offices.through)
+@receiver([post_save, post_delete], sender=Position)
+@receiver([post_save, post_delete], sender=Unit)
+def invalidate_vacancy_counters(sender, **kwargs):
+    """Сбрасывает счетчики опубликованных вакансий по подразделениям и городам."""
+    Vacancy.invalidate_published_counters()
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+@receiver([post_save, post_delete], sender=VacancyToOffice)
+@receiver(m2m_changed, sender=Vacancy.offices.through)
+def invalidate_vacancy_list_counts(sender, **kwargs):
+    """Сбрасывает закэшированные total списков вакансий."""
+    invalidate_pagination_counts()
+
+
+@receiver([post_save, post_delete], sender=Factoid)
+def invalidate_factoid_ids(sender, **kwargs):
+    """Сбрасывает закэшированный список id фактоидов."""
+    Factoid.invalidate_ids()
@@ -0,0 +1,170 @@
+import datetime
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from mixer.backend.django import mixer
+
+from app.tests.api_test_case import ApiTestCase
+from company.models import City, Position, Unit
+from company.tree import UnitTree
+from replies.enums import ReplyStatusChoices
+from replies.models import Reply
+from users.models import User
+from vacancies.enums import VacancyStateChoices, VacancyStatusChoices
+from vacancies.models import (
+    VACANCY_SEARCH_CONFIG,
+    Image,
+    Rate,
+    Restrict,
+    Vacancy,
+    VacancyToImage,
+    VacancyToOffice
+)
+
+
+@mock.patch.object(User, 'top_performer_rate', 'A')
+class VacanciesListTestCase(ApiTestCase):
+    url = f'/{settings.API_PREFIX}/vacancies'
+
+    def setUp(self):
+        self.user = mixer.blend(User)
+        self.c.force_authenticate(self.user)
+        self.rate = mixer.blend(Rate, title='B')
+
+    def create_vacancies(self, count):
+        return mixer.cycle(count).blend(
+            Vacancy, status=VacancyStatusChoices.PUBLISHED, rate=self.rate, unit=None, position=None,
+            manager=mixer.SELECT, recruiter=None,
+        )
+
+    def get_list_queries_count(self):
+        # total списка кэшируется, а сброс кэша после коммита в TestCase не выполняется
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.api_get(self.url, {'limit': 50})
+        return len(queries)
+
+    def test_list_queries_count_does_not_depend_on_page_size(self):
+        mixer.cycle(3).blend(User)
+        self.create_vacancies(1)
+        one_vacancy_queries_count = self.get_list_queries_count()
+
+        vacancies = self.create_vacancies(30)
+        for vacancy in vacancies[:10]:
+            mixer.blend(Reply, vacancy=vacancy, user=mixer.SELECT, status=ReplyStatusChoices.PENDING)
+        mixer.blend(Reply, vacancy=vacancies[10], user=self.user, status=ReplyStatusChoices.PENDING)
+        mixer.blend(Restrict, vacancy=vacancies[11], user=self.user)
+
+        self.assertEqual(self.get_list_queries_count(), one_vacancy_queries_count)
+
+    def test_list_state_and_reply(self):
+        replied, restricted, other = self.create_vacancies(3)
+        reply = mixer.blend(Reply, vacancy=replied, user=self.user, status=ReplyStatusChoices.PENDING)
+        mixer.blend(Restrict, vacancy=restricted, user=self.user)
+
+        data = {vacancy['id']: vacancy for vacancy in self.api_get(self.url)['data']}
+
+        self.assertEqual(data[replied.id]['state'], VacancyStateChoices.REPLIED.slug_name_dict)
+        self.assertEqual(data[replied.id]['reply']['id'], reply.id)
+        self.assertEqual(data[replied.id]['replies_count'], 1)
+        self.assertEqual(data[restricted.id]['state'], VacancyStateChoices.TEST_FAILED.slug_name_dict)
+        self.assertEqual(data[other.id]['state'], VacancyStateChoices.REPLY.slug_name_dict)
+        self.assertIsNone(data[other.id]['reply'])
+        self.assertEqual(data[other.id]['replies_count'], 0)
+
+    def test_list_cursor_pages_follow_offset_order(self):
+        vacancies = self.create_vacancies(9)
+        for i, vacancy in enumerate(vacancies):
+            vacancy.hot = i % 3 == 0
+            vacancy.published_at = None if i % 4 == 0 else datetime.date(2024, 1, 1 + i % 2)
+        Vacancy.objects.bulk_update(vacancies, fields=('hot', 'published_at'))
+        expected = [vacancy['id'] for vacancy in self.api_get(self.url, {'limit': 50})['data']]
+
+        response = self.api_get(self.url, {'limit': 4})
+        ids = [vacancy['id'] for vacancy in response['data']]
+        while response['pagination']['next']:
+            response = self.api_get(self.url, {'limit': 4, 'cursor': response['pagination']['next']})
+            self.assertIsNone(response['pagination']['total'])
+            ids += [vacancy['id'] for vacancy in response['data']]
+
+        self.assertEqual(ids, expected)
+
+    def test_list_cursor_pages_with_equal_search_rank(self):
+        vacancies = self.create_vacancies(7)
+        for vacancy in vacancies:
+            vacancy.title = 'Ведущий инженер'
+            vacancy.hot = False
+        Vacancy.objects.bulk_update(vacancies, fields=('title', 'hot'))
+        # В базе тестов вектор может не заполняться триггером
+        Vacancy.objects.update(search_vector=SearchVector('title', weight='A', config=VACANCY_SEARCH_CONFIG))
+
+        expected = [vacancy['id'] for vacancy in self.api_get(self.url, {'limit': 50, 'query': 'инженер'})['data']]
+        params = {'limit': 3, 'query': 'инженер'}
+        ids = []
+        # Страниц не больше, чем вакансий: при ошибке в курсоре страницы могут повторяться бесконечно
+        for _ in vacancies:
+            response = self.api_get(self.url, params)
+            ids += [vacancy['id'] for vacancy in response['data']]
+            if not response['pagination']['next']:
+                break
+            params['cursor'] = response['pagination']['next']
+
+        self.assertEqual(len(expected), len(vacancies))
+        self.assertEqual(ids, expected)
+
+
+@mock.patch.object(User, 'top_performer_rate', 'A')
+@override_settings(DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage')
+class VacancyDetailTestCase(ApiTestCase):
+
+    def setUp(self):
+        self.user = mixer.blend(User)
+        self.c.force_authenticate(self.user)
+
+    def create_vacancy(self, units_depth, offices_count):
+        unit = None
+        for i in range(units_depth):
+            # Поля дерева заполняет mptt, а не mixer
+            unit = Unit.objects.create(name=f'unit {i}', code=str(Unit.objects.count()), parent=unit)
+        manager = mixer.blend(User, position=mixer.blend(Position, unit=unit))
+        vacancy = mixer.blend(
+            Vacancy, status=VacancyStatusChoices.PUBLISHED, unit=unit, manager=manager, recruiter=manager,
+            position=mixer.blend(Position, unit=unit), rate=mixer.blend(Rate),
+        )
+        for i in range(offices_count):
+            mixer.blend(VacancyToOffice, vacancy=vacancy, office__city=mixer.blend(City), is_main=i == 0)
+            VacancyToImage.objects.create(vacancy=vacancy, image=Image.objects.create(file=f'image_{i}.png'))
+        return vacancy
+
+    def test_detail(self):
+        vacancy = self.create_vacancy(units_depth=3, offices_count=2)
+        data = self.api_get(f'/{settings.API_PREFIX}/vacancies/{vacancy.id}')['data']
+
+        self.assertEqual(data['company_units_chain'], [
+            {'name': 'unit 0', 'code': '0', 'parent_code': None},
+            {'name': 'unit 1', 'code': '1', 'parent_code': '0'},
+            {'name': 'unit 2', 'code': '2', 'parent_code': '1'},
+        ])
+        offices = {office['id']: office for office in data['offices']}
+        for link in VacancyToOffice.objects.filter(vacancy=vacancy):
+            self.assertEqual(offices[link.office_id]['is_main'], link.is_main)
+            self.assertEqual(offices[link.office_id]['city']['id'], link.office.city_id)
+        self.assertEqual(
+            sorted(city['id'] for city in data['cities']),
+            sorted(VacancyToOffice.objects.filter(vacancy=vacancy).values_list('office__city', flat=True))
+        )
+        self.assertEqual(len(data['images']), 2)
+
+    def test_detail_queries_count(self):
+        small = self.create_vacancy(units_depth=1, offices_count=1)
+        large = self.create_vacancy(units_depth=4, offices_count=3)
+        # Цепочка подразделений берется из дерева в памяти
+        UnitTree.get()
+        # Вакансия, офисы с городами, изображения и get_or_create VacancyViewed (select, savepoint, insert, release)
+        for vacancy in (small, large):
+            with self.assertNumQueries(7):
+                self.api_get(f'/{settings.API_PREFIX}/vacancies/{vacancy.id}')
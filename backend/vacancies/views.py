@@ -1,5 +1,4 @@
-from django.db.models import CharField, Exists, F, OuterRef, Q, Value
-from django.db.models.functions import Concat
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import generics, serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser
@@ -7,9 +6,9 @@ from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED
 
 from app import errors
-from app.pagination import DataWrappingLimitOffsetPagination
+from app.pagination import DataWrappingKeysetPagination, DataWrappingLimitOffsetPagination
 from app.responses import NoContentResponse, NotFoundResponse
-from company.models import Unit
+from company.tree import UnitTree
 from core.enums import CAREER_TYPE_MAP
 from core.permissions import ReadOnly
 from users.permissions import IsHeadHR, IsHR, IsManager
@@ -17,6 +16,7 @@ from vacancies.enums import (
     ROLE_TO_VACANCY_FILTERS,
     VacancyOwnerChoices,
     VacancyRoleChoices,
+    VacancySearchWeights,
     VacancyStatusChoices
 )
 from vacancies.models import (
@@ -57,7 +57,7 @@ from vacancies.serializers import (
 
 class VacanciesListCreateView(generics.ListCreateAPIView):
     """Короткое описание вакансии для карточек с вакансиями."""
-    pagination_class = DataWrappingLimitOffsetPagination
+    pagination_class = DataWrappingKeysetPagination
     permission_classes = (ReadOnly | IsAdminUser | IsHR | IsHeadHR | IsManager,)
 
     def get_serializer_class(self):
@@ -78,16 +78,8 @@ class VacanciesListCreateView(generics.ListCreateAPIView):
         city_id = self.request.query_params.get('city_id')
         career = self.request.query_params.get('career')
         q = Q(status=VacancyStatusChoices.PUBLISHED)
-        full_name = Concat(
-            F('manager__first_name'), Value(' '), F('manager__last_name'), output_field=CharField()
-        )
         if type:
             q &= Vacancy.get_q_for_vacancy_type(type, self.request.user)
-        if query:
-            title_q = Q(title__icontains=query)
-            manager_q = Q(full_name__icontains=query)
-            unit_q = Q(unit__name__icontains=query)
-            q &= (title_q | manager_q | unit_q)
         if city_id:
             q &= Q(offices__city=city_id)
         if career:
@@ -96,10 +88,18 @@ class VacanciesListCreateView(generics.ListCreateAPIView):
             # в уровнях должностей нет пробела, поэтому фильтрация вернет пустой кверисет
             q &= Q(position__level__icontains=CAREER_TYPE_MAP.get(career, ' '))
         if unit_code:
-            units = Unit.objects.filter(code=unit_code).get_descendants()
-            q &= Q(unit__in=units)
-        return Vacancy.objects.prefetch_related('restrictions', 'replies', 'position').annotate(
-            full_name=full_name).filter(q).order_by('-hot', '-published_at', '-id').distinct()
+            unit_tree = UnitTree.get()
+            unit = unit_tree.get_by_code(unit_code)
+            q &= Q(unit__in=unit_tree.get_descendant_ids(unit.id) if unit else [])
+        queryset = Vacancy.objects.filter(q)
+        ordering = ['-hot', '-published_at', '-id']
+        if query:
+            # Поиск по названию, подразделению, руководителю, задачам и ожиданиям
+            queryset = queryset.search(query)
+            ordering.insert(1, '-search_rank')
+        return queryset.select_related(
+            'unit', 'rate', 'manager', 'manager__position'
+        ).with_replies_count().with_user_reply(self.request.user).order_by(*ordering).distinct()
 
 
 class VacancyView(generics.RetrieveAPIView):
@@ -125,11 +125,10 @@ class VacancyView(generics.RetrieveAPIView):
         return obj
 
     def get_queryset(self):
-        queryset = Vacancy.objects.select_related(
-            'unit', 'manager', 'position', 'rate', 'recruiter',
-            'vacancy_type', 'reason', 'work_experience', 'work_contract'
-        ).prefetch_related('offices')
+        queryset = Vacancy.objects.all()
         serializer = self.get_serializer_class()
+        if serializer == VacancySerializer:
+            return queryset.with_detail_relations().with_replies_count().with_user_reply(self.request.user)
         if serializer == VacancyCreateUpdateSerializer:
             # Редактировать можно только заявки в драфте
             return queryset.filter(status__in=(VacancyStatusChoices.MODERATION, VacancyStatusChoices.PUBLISHED))
@@ -154,7 +153,7 @@ class FactoidView(generics.ListAPIView):
 
     def get_queryset(self):
         limit = int(self.request.query_params.get('limit', 1000))
-        return Factoid.objects.order_by('?')[:limit]
+        return Factoid.get_random(limit)
 
 
 class PollView(generics.CreateAPIView, generics.RetrieveAPIView):
@@ -232,7 +231,7 @@ class RoleVacanciesView(generics.ListAPIView):
 
     role: str = None
     serializer_class = MyVacancySerializer
-    pagination_class = DataWrappingLimitOffsetPagination
+    pagination_class = DataWrappingKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -250,16 +249,8 @@ class RoleVacanciesView(generics.ListAPIView):
 
         q = vacancy_role_to_q_map[role]
 
-        full_name = Concat(
-            F('recruiter__first_name'), Value(' '), F('recruiter__last_name'), output_field=CharField()
-        )
-
         if query_params.get('status'):
             q &= Q(status=query_params.get('status'))
-        if query_params.get('query'):
-            title_q = Q(title__icontains=query_params.get('query'))
-            recruiter_q = Q(full_name__icontains=query_params.get('query'))
-            q &= (title_q | recruiter_q)
         if role == VacancyRoleChoices.HR:
             vacancy_owner_to_q_map = {
                 VacancyOwnerChoices.ME: Q(recruiter=user),
@@ -273,10 +264,16 @@ class RoleVacanciesView(generics.ListAPIView):
                 q &= ~Q(status__in=query_params.get('status_exclude'))
         if query_params.get('selection_type'):
             q &= Q(selection_type=query_params.get('selection_type'))
+        queryset = Vacancy.objects.filter(q)
+        ordering = ['-hot', '-id']
+        if query_params.get('query'):
+            # Поиск по названию или ФИО рекрутера
+            queryset = queryset.search(query_params.get('query'), weights=VacancySearchWeights.RECRUITER)
+            ordering.insert(1, '-search_rank')
         is_viewed = VacancyViewed.objects.filter(vacancy=OuterRef('pk'), user=user)
-        return Vacancy.objects.prefetch_related('replies').select_related('recruiter').annotate(
-            full_name=full_name, is_new=~Exists(is_viewed)
-        ).filter(q).order_by('-hot', '-id').distinct()
+        return queryset.prefetch_related('replies').select_related('recruiter').annotate(
+            is_new=~Exists(is_viewed)
+        ).order_by(*ordering).distinct()
 
 
 class RoleHeadHRVacanciesView(RoleVacanciesView):